@@ -0,0 +1,263 @@
+# benchmark of the fill_taxes pipeline on synthetic inputs
+# every stage is timed on its own: gather_inputs, fill_taxes_<year>, save_json, fill_pdfs, merge_pdfs
+# results (time, throughput, peak memory) go to benchmark_results/<commit>.json, compare them across commits with
+#   python benchmark.py --compare benchmark_results/<old>.json benchmark_results/<new>.json
+# and check that merged pdfs filled by several threads at once are the serial ones with
+#   python benchmark.py --check-threads 8
+import os
+import sys
+import copy
+import json
+import time
+import random
+import logging
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import build_keys
+import fill_taxes
+import utils.forms_utils
+from utils.forms_constants import pdf_extension, json_extension
+
+
+benchmark_results_folder = "benchmark_results"
+benchmark_seed = 1040  # same synthetic inputs on every run
+
+# sizes of the synthetic returns
+scenarios = {
+    "small": dict(w2=1, accounts=1, trades=20, payments=12),
+    "medium": dict(w2=2, accounts=3, trades=500, payments=24),
+    "large": dict(w2=4, accounts=10, trades=5_000, payments=120),
+}
+
+trade_kinds = [("SHORT", "A"), ("SHORT", "B"), ("LONG", "D"), ("LONG", "E")]
+
+
+def synthetic_input(year, w2=1, accounts=1, trades=10, payments=12, seed=benchmark_seed):
+    # input.json of the year scaled up: w2 W2s, accounts 1099s with trades each, 1098 with payments (if the year has one)
+    # names / addresses are the sample ones, so that the W2 checks pass
+    # wages are half the sample ones and trades about even, the income stays within what the forms implement
+    rng = random.Random(seed)
+    with open(os.path.join("input_data", year, "input.json")) as f:
+        sample = json.load(f)
+    data = dict(sample)
+
+    w2_sample = sample['W2'][0]
+    data['W2'] = []
+    for i in range(w2):
+        one = dict(w2_sample)
+        for k in ['Wages', 'SocialSecurity_wages', 'Medicare_wages', 'Federal_tax', 'SocialSecurity_tax',
+                  'Medicare_tax', 'State_tax', 'Local_tax']:
+            if isinstance(one.get(k), float):
+                one[k] = round(one[k] / w2 * rng.uniform(0.45, 0.55), 2)
+        data['W2'].append(one)
+
+    data['1099'] = []
+    for i in range(accounts):
+        account = {
+            "Institution": f"Synthetic Brokerage {i} LLC",
+            "Interest": round(rng.uniform(0, 500), 2),
+            "Ordinary Dividends": round(rng.uniform(0, 5_000), 2),
+            "Qualified Dividends": round(rng.uniform(0, 2_000), 2),
+            "Trades": [],
+        }
+        for j in range(trades):
+            long_short, form_code = rng.choice(trade_kinds)
+            proceeds = round(rng.uniform(10, 20_000), 2)
+            trade = {
+                "SalesDescription": f"SYNTH{j % 500} CORP",
+                "Shares": float(rng.randint(1, 1_000)),
+                "DateAcquired": f"0{rng.randint(1, 9)},{rng.randint(10, 28)},{int(year) - 1}",
+                "DateSold": f"0{rng.randint(1, 9)},{rng.randint(10, 28)},{year}",
+                "Proceeds": proceeds,
+                "Cost": round(proceeds * rng.uniform(0.95, 1.05), 2),
+                "LongShort": long_short,
+                "FormCode": form_code,
+            }
+            if rng.random() < 0.05:
+                trade.update(WashSaleValue=round(rng.uniform(1, 500), 2), WashSaleCode="W")
+            account["Trades"].append(trade)
+        data['1099'].append(account)
+
+    if '1098' in sample:
+        mortgage = dict(sample['1098'][0])
+        mortgage['Payments'] = [
+            {"Date": f"{year}/{i % 12 + 1}/1", "InterestAmount": round(rng.uniform(500, 5_000), 2),
+             "PrincipalAmount": round(rng.uniform(0, 1_000), 2)}
+            for i in range(payments)
+        ]
+        data['1098'] = [mortgage]
+    return data
+
+
+def ensure_keys(year):
+    # the forms need their .keys files, utils.forms_clean removes them after main.main
+    build_keys.build(year)
+
+
+def measure(function, repeat):
+    # best wall time over repeat runs, then one more run under tracemalloc for the peak memory
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(times), peak
+
+
+def run_scenario(name, sizes, years=("2023", "2024"), repeat=3):
+    # one entry per (year, stage): seconds, peak_mb, units (what the throughput counts), per_second
+    # years are not chained: a synthetic year may end with a gain, which has no carryover worksheet
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for year in years:
+            ensure_keys(year)
+            input_folder = os.path.join(folder, "input_data", year)
+            os.makedirs(input_folder)
+            with open(os.path.join(input_folder, "input.json"), 'w') as f:
+                json.dump(synthetic_input(year, **sizes), f)
+            n_trades = sizes['accounts'] * sizes['trades']
+
+            def record(stage, function, units, count=None):
+                result, seconds, peak = measure(function, repeat)
+                count = count(result) if callable(count) else count
+                results[f"{year} {stage}"] = dict(
+                    seconds=seconds, peak_mb=peak / 2 ** 20, units=units, count=count,
+                    per_second=count / seconds if seconds else None,
+                )
+                return result
+
+            # gather_inputs joins its folder to "input_data", an absolute folder is taken as is
+            data = record("gather_inputs", lambda: fill_taxes.gather_inputs(input_year_folder=input_folder),
+                          "trades", n_trades)
+            states, worksheets, summary = record(
+                "fill_taxes", lambda: fill_taxes.fill_taxes_by_year[year](copy.deepcopy(data), None),
+                "trades", n_trades)
+            out_json = os.path.join(folder, "data" + year + json_extension)
+            record("save_json", lambda: fill_taxes.save_json(data=states, out=out_json),
+                   "bytes", lambda _: os.path.getsize(out_json))
+            output_folder = os.path.join(folder, "output")
+            pdf_files = record("fill_pdfs", lambda: fill_taxes.fill_pdfs(states, year, output_folder=output_folder),
+                               "files", len)
+            out_pdf = os.path.join(folder, "forms" + year + pdf_extension)
+            record("merge_pdfs", lambda: fill_taxes.merge_pdfs(pdf_files, out_pdf), "files", len(pdf_files))
+    return results
+
+
+def check_threads(years=("2023", "2024"), threads=8, sizes=scenarios["medium"]):
+    # the merged pdf of the synthetic return, filled by threads at once from a cold template cache,
+    # has to be the one filled serially: the threads share the cached templates
+    # returns the years whose pdfs differ
+    different = []
+    with tempfile.TemporaryDirectory() as folder:
+        for year in years:
+            ensure_keys(year)
+            input_folder = os.path.join(folder, "input_data", year)
+            os.makedirs(input_folder)
+            with open(os.path.join(input_folder, "input.json"), 'w') as f:
+                json.dump(synthetic_input(year, **sizes), f)
+            data = fill_taxes.gather_inputs(input_year_folder=input_folder)
+            states, _, _ = fill_taxes.fill_taxes_by_year[year](data, None)
+            serial = os.path.join(folder, f"serial{year}{pdf_extension}")
+            fill_taxes.fill_merged_pdf(states, year, serial)
+            utils.forms_utils._load_template.cache_clear()
+            outs = [os.path.join(folder, f"thread{i}_{year}{pdf_extension}") for i in range(threads)]
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                list(pool.map(lambda out: fill_taxes.fill_merged_pdf(states, year, out), outs))
+            with open(serial, 'rb') as f:
+                expected = f.read()
+            for out in outs:
+                with open(out, 'rb') as f:
+                    if f.read() != expected:
+                        different.append(year)
+                        break
+            print(f"{year}: {threads} threads {'differ from' if year in different else 'same as'} serial")
+    return different
+
+
+def commit_id():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(names=None, repeat=3, out=None):
+    logging.disable(logging.INFO)  # console logging would be most of what gets timed
+    report = dict(
+        commit=commit_id(), python=platform.python_version(), machine=platform.machine(), seed=benchmark_seed,
+        repeat=repeat, scenarios={},
+    )
+    for name in names or scenarios:
+        report['scenarios'][name] = dict(sizes=scenarios[name], stages=run_scenario(name, scenarios[name],
+                                                                                    repeat=repeat))
+    logging.disable(logging.NOTSET)
+    os.makedirs(benchmark_results_folder, exist_ok=True)
+    out = out or os.path.join(benchmark_results_folder, report['commit'] + json_extension)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=4)
+    print_report(report)
+    print(f"Results in {out}")
+    return report
+
+
+def print_report(report):
+    print(f"commit {report['commit']} python {report['python']}")
+    for name, scenario in report['scenarios'].items():
+        print(f"{name} {scenario['sizes']}")
+        for stage, r in scenario['stages'].items():
+            rate = f"{r['per_second']:,.0f} {r['units']}/s" if r['per_second'] else ""
+            print(f"  {stage:<22} {r['seconds'] * 1e3:>10.1f} ms {r['peak_mb']:>9.1f} MB  {rate}")
+
+
+def compare(old_file, new_file):
+    # new / old time and peak memory for every stage both runs have, above 1 is slower / bigger
+    with open(old_file) as f:
+        old = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+    print(f"{old['commit']} -> {new['commit']}")
+    for name, scenario in new['scenarios'].items():
+        if name not in old['scenarios'] or old['scenarios'][name]['sizes'] != scenario['sizes']:
+            continue
+        print(name)
+        old_stages = old['scenarios'][name]['stages']
+        for stage, r in scenario['stages'].items():
+            if stage in old_stages:
+                o = old_stages[stage]
+                print(f"  {stage:<22} time x{r['seconds'] / o['seconds']:.2f}  memory x{r['peak_mb'] / o['peak_mb']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the fill_taxes pipeline stages on synthetic inputs")
+    parser.add_argument("scenarios", nargs="*", help=f"among {', '.join(scenarios)}, all of them if none")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--check-threads", type=int, metavar="THREADS",
+                        help="only check that merged pdfs filled by threads at once are the serial ones")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(scenarios)
+    if unknown:
+        parser.error(f"unknown scenarios {', '.join(sorted(unknown))}")
+    if args.check_threads:
+        logging.disable(logging.INFO)
+        return 1 if check_threads(threads=args.check_threads) else 0
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args.scenarios, repeat=args.repeat, out=args.out)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+# make-style build of the forms/<year>/<sub>/<form>.keys files
+# a .keys depends on its blank pdf, on its fields definition (fill_keys.fields_definition text of the form) and on the
+# recipe: the source of the functions numbering and naming the widgets, not the whole files they are in
+# only the forms whose pdf, fields or recipe changed are built again, in memory: widgets of the template numbered as in
+# key_matcher, named from the fields definition as in fill_keys, no key_mapping / fields_mapping files in between
+# the others get their .keys back from keys_cache/, which utils.forms_clean leaves alone
+#   keys_cache/<year>.json  manifest: per form, the pdf, fields and recipe hashes, and the hash of the .keys built
+#   keys_cache/objects/<sha256>  .keys contents, no .keys extension so that clean does not remove them
+# file hashes are only recomputed when a file mtime or size changed
+# the numbered / named pdfs of key_mapping / fields_mapping are only written on demand, see debug_pdfs
+import os
+import io
+import glob
+import json
+import time
+import shutil
+import hashlib
+import inspect
+import argparse
+import threading
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import key_matcher
+import fill_keys
+from utils.forms_constants import logger, keys_extension, json_extension, pdf_extension, fields_extension, \
+    keys_cache_folder, ANNOT_FIELD_TYPE_BTN
+from utils.forms_utils import parse_keys, keys_text, template_keys, fill_pdf_from_keys, default_keys_folders
+
+
+manifest_version = 2  # bump when the manifest layout changes, everything is rebuilt once
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(2 ** 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def stamp(path, previous=None):
+    # mtime, size and content hash of path, the hash of previous is reused when mtime and size match
+    stat = os.stat(path)
+    if previous and previous['mtime'] == stat.st_mtime_ns and previous['size'] == stat.st_size:
+        return previous
+    return dict(mtime=stat.st_mtime_ns, size=stat.st_size, sha=file_hash(path))
+
+
+def template_files(year, folders=default_keys_folders):
+    forms_year_folder = os.path.join(folders.forms, year)
+    return sorted(u for u in glob.glob(os.path.join(forms_year_folder, "*", "", "*")) if key_matcher.is_template(u))
+
+
+class KeysCache:
+    def __init__(self, folder=keys_cache_folder):
+        self.folder = folder
+        self.objects = os.path.join(folder, "objects")
+
+    def manifest_path(self, year):
+        return os.path.join(self.folder, year + json_extension)
+
+    def load_manifest(self, year):
+        try:
+            with open(self.manifest_path(year)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return dict(version=manifest_version, recipe={}, forms={})
+        if manifest.get('version') != manifest_version:
+            logger.info("Keys manifest %s has version %s, expected %s - rebuilding",
+                        self.manifest_path(year), manifest.get('version'), manifest_version)
+            return dict(version=manifest_version, recipe={}, forms={})
+        return manifest
+
+    @staticmethod
+    def tmp_path(path):
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # several builds may write at once
+
+    def save_manifest(self, year, manifest):
+        os.makedirs(self.folder, exist_ok=True)
+        path = self.manifest_path(year)
+        tmp = self.tmp_path(path)
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp, path)
+
+    def object_path(self, sha):
+        return os.path.join(self.objects, sha)
+
+    def has(self, sha):
+        return sha is not None and os.path.isfile(self.object_path(sha))
+
+    def put(self, file, sha):
+        # copy2 keeps the mtime, restored files then look unchanged to the keys index of utils.forms_utils
+        os.makedirs(self.objects, exist_ok=True)
+        path = self.object_path(sha)
+        if not os.path.isfile(path):
+            tmp = self.tmp_path(path)
+            shutil.copy2(file, tmp)
+            os.replace(tmp, path)
+
+    def restore(self, sha, file):
+        shutil.copy2(self.object_path(sha), file)
+
+    def prune(self):
+        # objects no manifest refers to, not while a build is running: its objects are not in a manifest yet
+        used = set()
+        for manifest_file in glob.glob(os.path.join(self.folder, "*" + json_extension)):
+            with open(manifest_file) as f:
+                used.update(entry['keys'] for entry in json.load(f)['forms'].values())
+        for name in os.listdir(self.objects) if os.path.isdir(self.objects) else []:
+            if name not in used and not name.endswith(".tmp"):
+                os.remove(self.object_path(name))
+                logger.debug("Removed unused keys object %s", name)
+
+
+def recipe_functions():
+    # what turns a blank pdf and its fields definition into a .keys, see form_keys
+    return [template_keys, parse_keys, keys_text, fill_keys.named_keys, form_keys]
+
+
+def recipe_hash():
+    # (hash of the recipe, {function: hash of its source})
+    # by name, build_keys is __main__ when run as a script
+    stamps = {f.__name__: text_hash(inspect.getsource(f)) for f in recipe_functions()}
+    h = hashlib.sha256()
+    for name, sha in sorted(stamps.items()):
+        h.update(f"{name} {sha}\n".encode())
+    return h.hexdigest(), stamps
+
+
+def fields_text(year, file, folders=default_keys_folders):
+    # fields definition of the blank form file, picked by fill_keys from the fields_mapping path and the year
+    rel = os.path.relpath(file, os.path.join(folders.forms, year))
+    fields_file = os.path.splitext(os.path.join(folders.fields_mapping, year, rel))[0] + fields_extension
+    return fill_keys.fields_definition(fields_file, year)
+
+
+def form_keys(year, file, folders=default_keys_folders):
+    # (numbered, named) keys of the blank form file, what key_matcher and fill_keys write in their .keys files
+    # through the text of the numbered .keys, the names are split as load_keys splits them
+    numbered = parse_keys(io.StringIO(keys_text(template_keys(file))), out_dict=False)
+    named = fill_keys.named_keys(io.StringIO(fields_text(year, file, folders)), numbered)
+    return numbered, named
+
+
+def build_form(year, file, folders=default_keys_folders):
+    # .keys of one blank form, returns (year, file, seconds), runs in the build_years process pool
+    start = time.perf_counter()
+    numbered, named = form_keys(year, file, folders)
+    k_file = os.path.splitext(file)[0] + keys_extension
+    with open(k_file, 'w') as f:
+        f.write(keys_text(named))
+    seconds = time.perf_counter() - start
+    logger.info("Keys built %s in %.3fs", k_file, seconds)
+    return year, file, seconds
+
+
+def debug_pdfs(year, files=None, folders=default_keys_folders):
+    # the pdfs to check the keys by eye: template filled with the widget numbers in key_mapping/<year>,
+    # and with the field names in fields_mapping/<year>
+    forms_year_folder = os.path.join(folders.forms, year)
+    for file in files or template_files(year, folders):
+        numbered, named = form_keys(year, file, folders)
+        rel = os.path.relpath(file, forms_year_folder)
+        d = {k: (i, t) for i, k, t in numbered}
+        d.update({k: (n, t) for n, k, t in named})
+        for folder, values in [
+            (folders.key_mapping, {k: i for i, k, _ in numbered}),
+            (folders.fields_mapping, {k: True if t == ANNOT_FIELD_TYPE_BTN else v for k, (v, t) in d.items()}),
+        ]:
+            out_file = os.path.join(folder, year, os.path.splitext(rel)[0] + pdf_extension)
+            os.makedirs(os.path.dirname(out_file), exist_ok=True)
+            fill_pdf_from_keys(file=file, out_file=out_file, d=values)
+
+
+def plan(year, cache, folders=default_keys_folders):
+    # (entries of the new manifest, stale template files, recipe stamps)
+    forms_year_folder = os.path.join(folders.forms, year)
+    manifest = cache.load_manifest(year)
+    recipe, recipe_stamps = recipe_hash()
+
+    forms = {}
+    stale = []
+    for file in template_files(year, folders):
+        rel = os.path.relpath(file, forms_year_folder)
+        old = manifest['forms'].get(rel, {})
+        pdf = stamp(file, old.get('pdf'))
+        fields = text_hash(fields_text(year, file, folders))
+        if old.get('recipe') == recipe and old.get('fields') == fields and old.get('pdf', {}).get('sha') == pdf['sha'] \
+                and cache.has(old.get('keys')):
+            forms[rel] = dict(old, pdf=pdf)
+        else:
+            forms[rel] = dict(pdf=pdf, fields=fields, recipe=recipe, keys=None)
+            stale.append(file)
+    return forms, stale, recipe_stamps
+
+
+def finish(year, cache, forms, recipe_stamps, rebuilt, folders=default_keys_folders):
+    # built .keys into the cache, the others restored from it, manifest saved
+    forms_year_folder = os.path.join(folders.forms, year)
+    for rel in rebuilt:
+        k_file = os.path.splitext(os.path.join(forms_year_folder, rel))[0] + keys_extension
+        if not os.path.isfile(k_file):
+            logger.error("No keys built for %s", rel)
+            del forms[rel]  # stale again next time
+            continue
+        sha = file_hash(k_file)
+        cache.put(k_file, sha)
+        forms[rel]['keys'] = sha
+
+    restored = 0
+    for rel, entry in forms.items():
+        k_file = os.path.splitext(os.path.join(forms_year_folder, rel))[0] + keys_extension
+        if not os.path.isfile(k_file) or stamp(k_file, entry.get('out'))['sha'] != entry['keys']:
+            cache.restore(entry['keys'], k_file)
+            restored += 1
+        entry['out'] = stamp(k_file, entry.get('out'))
+
+    cache.save_manifest(year, dict(version=manifest_version, recipe=recipe_stamps, forms=forms))
+    logger.info("Keys for %s: %s rebuilt, %s restored, %s up to date",
+                year, len(rebuilt), restored, len(forms) - len(rebuilt) - restored)
+
+
+def build_years(years, cache=None, folders=default_keys_folders, workers=1):
+    # forms/<year> .keys up to date for every year, returns {year: {relative pdf path: seconds}} for the forms built
+    # the stale (year, form) pairs of all the years are built together, workers > 1 spreads them over a process pool
+    # (None for one per cpu), every form writes its own .keys and the manifests are only written here
+    cache = cache or KeysCache()
+    plans = {year: plan(year, cache, folders) for year in years}
+    tasks = [(year, file) for year, (_, stale, _) in plans.items() for file in stale]
+    tasks.sort(key=lambda task: -os.path.getsize(task[1]))  # biggest forms first, the workers end closer together
+    if workers == 1 or len(tasks) < 2:
+        results = [build_form(year, file, folders) for year, file in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(partial(build_form, folders=folders), *zip(*tasks)))
+
+    timings = {year: {} for year in years}
+    for year, file, seconds in results:
+        timings[year][os.path.relpath(file, os.path.join(folders.forms, year))] = seconds
+    for year, (forms, _, recipe_stamps) in plans.items():
+        finish(year, cache, forms, recipe_stamps, sorted(timings[year]), folders)
+    return timings
+
+
+def build(year, cache=None, folders=default_keys_folders, workers=1):
+    # forms/<year> .keys up to date, returns the relative paths of the pdfs whose keys were built again
+    # nothing global is changed, builds of different years can run at once in threads or processes
+    return sorted(build_years([year], cache, folders, workers)[year])
+
+
+def print_timings(timings, top=10):
+    forms = sorted(((seconds, year, rel) for year, t in timings.items() for rel, seconds in t.items()), reverse=True)
+    print(f"{len(forms)} forms built in {sum(s for s, _, _ in forms):.3f}s of worker time")
+    for seconds, year, rel in forms[:top]:
+        print(f"  {year} {rel:<30} {seconds * 1e3:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds the forms .keys files that are not up to date")
+    parser.add_argument("years", nargs="*", help="all the forms folders if none")
+    parser.add_argument("--debug", action="store_true", help="also write the numbered / named pdfs")
+    parser.add_argument("--workers", type=int, default=1, help="process pool size, 0 for one per cpu")
+    args = parser.parse_args()
+    years = args.years or sorted(os.listdir(default_keys_folders.forms))
+    print_timings(build_years(years, workers=args.workers or None))
+    if args.debug:
+        for y in years:
+            debug_pdfs(y)
+    KeysCache().prune()
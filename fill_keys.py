@@ -2,14 +2,16 @@
 # the fields file then contains the names of the fields to be mapped
 # with a clear syntax to describe tables and dollar/cents splits
 
+import io
+
 from utils.forms_utils import *
 
-year_folder = "2019"
+year_folder = "2019"  # when run as a script, the functions take the year and folders as arguments
 
 
-def create_empty_fields():
-    year_keys_name = os.path.join(key_mapping_folder, year_folder)
-    year_fields_name = os.path.join(fields_mapping_folder, year_folder)
+def create_empty_fields(year_folder, folders=default_keys_folders):
+    year_keys_name = os.path.join(folders.key_mapping, year_folder)
+    year_fields_name = os.path.join(folders.fields_mapping, year_folder)
     for u in glob.glob(os.path.join(year_keys_name, "*", "*")):
         if u.endswith(keys_extension):
             rel = os.path.relpath(u, year_keys_name)
@@ -24,8 +26,10 @@ def create_empty_fields():
             logger.info("File ignored %s", u)
 
 
-def fill_fields_files():
-    year_fields_name = os.path.join(fields_mapping_folder, year_folder)
+def fields_definition(u, year_folder):
+    # content of the .fields file u, picked from the form name in u and the year
+    # python -m utils.forms_layout <form pdf> drafts the table rows of a new form
+    f = io.StringIO()
 
     first_last_ssn = " first_name_initial last_name ssn"
     dependents = " first_last" \
@@ -48,808 +52,839 @@ def fill_fields_files():
     else:
         raise ValueError("year folder not defined for fill keys")
 
+    if "f1040." in u:
+        if year_folder == "2018":
+            f.write("single\n")
+            f.write("married_filling_jointly\n")
+            f.write("married_filling_separately\n")
+            f.write("head_of_household\n")
+            f.write("qualifying_widower\n")
+            f.write("qualifying_widower_name\n")
+            f.write("self" + first_last_ssn + "\n")
+
+            standard_deduction = " can_be_claimed_as_dependent_y" \
+                                 " born_before_19540102_y" \
+                                 " blind"
+
+            f.write("self" + standard_deduction + "\n")
+            f.write("spouse" + first_last_ssn + "\n")
+            f.write("spouse" + standard_deduction + "\n")  # check order for accuracy
+            f.write("spouse_itemizes_on_separate_or_dual_status_alien\n")
+            f.write("address\n")
+            f.write("apt\n")
+            f.write("city_state_zip\n")
+            f.write("full_year_health_coverage_or_exempt\n")
+            f.write("presidential_election self spouse\n")
+            f.write("more_than_four_dependents\n")
+            for i in range(1, 5):
+                f.write("dependent_" + str(i) + dependents + "\n")
+            f.write("self" + occupation_pin + "\n")
+            f.write("spouse" + occupation_pin + "\n")
+            f.write("preparer_name\n")
+            f.write("ptin\n")
+            f.write("firm_ein\n")
+            f.write("firm_name\n")
+            f.write("firm_phone\n")
+            f.write("third_party_designee\n")
+            f.write("self_employed\n")
+            f.write("firm_address\n")
+
+            lines = ['1']
+            for i in range(2, 6):
+                for j in range(2):
+                    lines.append(str(i) + chr(ord('a') + j))
+            for l in lines:
+                f.write(l + dollar_cents + "\n")
+            f.write("6_from_s1_22\n")
+            for i in range(6, 11):
+                f.write(str(i) + dollar_cents + "\n")
+            f.write("11a tax 1 2 3 3_value\n")
+            f.write("11b\n")
+            f.write("11" + dollar_cents + "\n")
+            f.write("12a\n")
+            f.write("12b\n")
+            for i in range(12, 17):
+                f.write(str(i) + dollar_cents + "\n")
+            f.write("17a\n")
+            f.write("17b\n")
+            f.write("17c\n")
+            f.write("17_from_5\n")
+            for i in range(17, 20):
+                f.write(str(i) + dollar_cents + "\n")
+            f.write("20a 8888" + dollar_cents + "\n")
+            f.write("20b\n")
+            f.write("20c checking savings\n")
+            f.write("20d\n")
+            for i in range(21, 24):
+                f.write(str(i) + dollar_cents + "\n")
+        elif year_folder == "2019":
+            f.write("single\n")
+            f.write("married_filling_jointly\n")
+            f.write("married_filling_separately\n")
+            f.write("head_of_household\n")
+            f.write("qualifying_widower\n")
+            f.write("qualifying_name\n")
+            f.write("self" + first_last_ssn + "\n")
+            f.write("spouse" + first_last_ssn + "\n")
+            f.write("address\n")
+            f.write("apt\n")
+            f.write("city_state_zip\n")
+
+            f.write("foreign country province postal\n")
+
+            # f.write("full_year_health_coverage_or_exempt\n")
+            f.write("presidential_election self spouse\n")
+            f.write("more_than_four_dependents\n")
+
+            f.write("can_be_claimed_as_dependent self spouse\n")
+            f.write("spouse_itemizes_on_separate_or_dual_status_alien\n")
+            f.write("born_before_19550102 self spouse\n")
+            f.write("blind self spouse\n")
+
+            for i in range(1, 5):
+                f.write("dependent_" + str(i) + dependents + "\n")
+
+            f.write("1\n")
+            f.write("2 a b\n")
+            f.write("3 a b\n")
+            f.write("4 a b c d\n")
+            f.write("5 a b\n")
+            f.write("6 n value\n")
+            f.write("7 a b\n")
+            f.write("8 a b\n")
+            f.write("9\n")
+            f.write("10\n")
+            f.write("11 a b\n")
+            f.write("12a 1 2 3 3_value\n")
+            f.write("12 a b\n")
+            f.write("13 a b\n")
+            f.write("14\n")
+            f.write("15\n")
+            f.write("16\n")
+            f.write("17\n")
+            f.write("18 a b c d e\n")
+            f.write("19\n")
+            f.write("20\n")
+
+            f.write("21a 8888 value\n")
+            f.write("21b\n")
+            f.write("21c checking savings\n")
+            f.write("21d\n")
+            for i in range(22, 25):
+                f.write(str(i) + "\n")
+
+            f.write("other_designee y n name phone pin\n")
+
+            f.write("self" + occupation_pin + "\n")
+            f.write("spouse" + occupation_pin + "\n")
+            f.write("phone\n")
+            f.write("email\n")
+
+            f.write("preparer_name\n")
+            f.write("ptin\n")
+            f.write("third_party_designee\n")
+            f.write("firm_name\n")
+            f.write("firm_phone\n")
+            f.write("self_employed\n")
+            f.write("firm_address\n")
+            f.write("firm_ein\n")
+        elif year_folder == "2020":
+            f.write("single\n")
+            f.write("married_filling_jointly\n")
+            f.write("married_filling_separately\n")
+            f.write("head_of_household\n")
+            f.write("qualifying_widower\n")
+            f.write("qualifying_name\n")
+            f.write("self" + first_last_ssn + "\n")
+            f.write("spouse" + first_last_ssn + "\n")
+            f.write("address\n")
+            f.write("apt\n")
+
+            f.write("city\n")
+            f.write("state\n")
+            f.write("zip\n")
+
+            f.write("foreign country province postal\n")
+
+            # f.write("full_year_health_coverage_or_exempt\n")
+            f.write("presidential_election self spouse\n")
+            f.write("virtual_currency y n\n")
+
+            f.write("can_be_claimed_as_dependent self spouse\n")
+            f.write("spouse_itemizes_on_separate_or_dual_status_alien\n")
+
+            f.write("self born_before_19560102 blind\n")
+            f.write("spouse born_before_19560102 blind\n")
+
+            f.write("more_than_four_dependents\n")
+
+            for i in range(1, 5):
+                f.write("dependent_" + str(i) + dependents + "\n")
+
+            f.write("1\n")
+            f.write("2 a b\n")
+            f.write("3 a b\n")
+            f.write("4 a b\n")
+            f.write("5 a b\n")
+            f.write("6 a b\n")
+            f.write("7 n value\n")
+            f.write("8\n")
+            f.write("9\n")
+            f.write("10 a b c\n")
+            f.write("11\n")
+            f.write("12\n")
+            f.write("13\n")
+            f.write("14\n")
+            f.write("15\n")
+            f.write("16 1 2 3 3_value\n")
+            f.write("16\n")
+            f.write("17\n")
+            f.write("18\n")
+            f.write("19\n")
+            f.write("20\n")
+            f.write("21\n")
+            f.write("22\n")
+            f.write("23\n")
+            f.write("24\n")
+            f.write("25 a b c d\n")
+            f.write("26\n")
+            f.write("27\n")
+            f.write("28\n")
+            f.write("29\n")
+            f.write("30\n")
+            f.write("31\n")
+            f.write("32\n")
+            f.write("33\n")
+            f.write("34\n")
+            f.write("35a 8888 value\n")
+            f.write("35b\n")
+            f.write("35c checking savings\n")
+            f.write("35d\n")
+            f.write("36\n")
+            f.write("37\n")
+            f.write("38\n")
+
+            f.write("other_designee y n name phone pin\n")
+
+            f.write("self" + occupation_pin + "\n")
+            f.write("spouse" + occupation_pin + "\n")
+            f.write("phone\n")
+            f.write("email\n")
+
+            f.write("preparer_name\n")
+            f.write("ptin\n")
+            f.write("self_employed\n")
+            f.write("firm_name\n")
+            f.write("firm_phone\n")
+            f.write("firm_address\n")
+            f.write("firm_ein\n")
+        elif year_folder == "2021":
+            f.write("single\n")
+            f.write("married_filling_jointly\n")
+            f.write("married_filling_separately\n")
+            f.write("head_of_household\n")
+            f.write("qualifying_widower\n")
+            f.write("qualifying_name\n")
+            f.write("self" + first_last_ssn + "\n")
+            f.write("spouse" + first_last_ssn + "\n")
+            f.write("address\n")
+            f.write("apt\n")
+
+            f.write("city\n")
+            f.write("state\n")
+            f.write("zip\n")
+
+            f.write("foreign country province postal\n")
+
+            # f.write("full_year_health_coverage_or_exempt\n")
+            f.write("presidential_election self spouse\n")
+            f.write("virtual_currency y n\n")
+
+            f.write("can_be_claimed_as_dependent self spouse\n")
+            f.write("spouse_itemizes_on_separate_or_dual_status_alien\n")
+
+            f.write("self born_before_19560102 blind\n")
+            f.write("spouse born_before_19560102 blind\n")
+
+            f.write("more_than_four_dependents\n")
+
+            for i in range(1, 5):
+                f.write("dependent_" + str(i) + dependents + "\n")
+
+            f.write("1\n")
+            f.write("2 a b\n")
+            f.write("3 a b\n")
+            f.write("4 a b\n")
+            f.write("5 a b\n")
+            f.write("6 a b\n")
+            f.write("7 n value\n")
+            f.write("8\n")
+            f.write("9\n")
+            f.write("10\n")
+            f.write("11\n")
+            f.write("12 a b c\n")
+            f.write("13\n")
+            f.write("14\n")
+            f.write("15\n")
+            f.write("16 1 2 3 3_value\n")
+            f.write("16\n")
+            f.write("17\n")
+            f.write("18\n")
+            f.write("19\n")
+            f.write("20\n")
+            f.write("21\n")
+            f.write("22\n")
+            f.write("23\n")
+            f.write("24\n")
+            f.write("25 a b c d\n")
+            f.write("26\n")
+            f.write("27 a check b c\n")
+            f.write("28\n")
+            f.write("29\n")
+            f.write("30\n")
+            f.write("31\n")
+            f.write("32\n")
+            f.write("33\n")
+            f.write("34\n")
+            f.write("35a 8888 value\n")
+            f.write("35b\n")
+            f.write("35c checking savings\n")
+            f.write("35d\n")
+            f.write("36\n")
+            f.write("37\n")
+            f.write("38\n")
+
+            f.write("other_designee y n name phone pin\n")
+
+            f.write("self" + occupation_pin + "\n")
+            f.write("spouse" + occupation_pin + "\n")
+            f.write("phone\n")
+            f.write("email\n")
+
+            f.write("preparer_name\n")
+            f.write("ptin\n")
+            f.write("self_employed\n")
+            f.write("firm_name\n")
+            f.write("firm_phone\n")
+            f.write("firm_address\n")
+            f.write("firm_ein\n")
+        elif year_folder == "2022":
+            f.write("single\n")
+            f.write("married_filling_jointly\n")
+            f.write("married_filling_separately\n")
+            f.write("head_of_household\n")
+            f.write("qualifying_widower\n")
+            f.write("qualifying_name\n")
+            f.write("self" + first_last_ssn + "\n")
+            f.write("spouse" + first_last_ssn + "\n")
+            f.write("address\n")
+            f.write("apt\n")
+
+            f.write("city\n")
+            f.write("state\n")
+            f.write("zip\n")
+
+            f.write("foreign country province postal\n")
+
+            # f.write("full_year_health_coverage_or_exempt\n")
+            f.write("presidential_election self spouse\n")
+            f.write("virtual_currency y n\n")
+
+            f.write("can_be_claimed_as_dependent self spouse\n")
+            f.write("spouse_itemizes_on_separate_or_dual_status_alien\n")
+
+            f.write("self born_before_19560102 blind\n")
+            f.write("spouse born_before_19560102 blind\n")
+
+            f.write("more_than_four_dependents\n")
+
+            for i in range(1, 5):
+                f.write("dependent_" + str(i) + dependents + "\n")
+
+            f.write("1 a b c d e f g h i z\n")
+            f.write("2 a b\n")
+            f.write("3 a b\n")
+            f.write("4 a b\n")
+            f.write("5 a b\n")
+            f.write("6 a b c\n")
+            f.write("7 n value\n")
+            f.write("8\n")
+            f.write("9\n")
+            f.write("10\n")
+            f.write("11\n")
+            f.write("12\n")
+            f.write("13\n")
+            f.write("14\n")
+            f.write("15\n")
+            f.write("16 1 2 3 3_value\n")
+            f.write("16\n")
+            f.write("17\n")
+            f.write("18\n")
+            f.write("19\n")
+            f.write("20\n")
+            f.write("21\n")
+            f.write("22\n")
+            f.write("23\n")
+            f.write("24\n")
+            f.write("25 a b c d\n")
+            f.write("26\n")
+            f.write("27\n")
+            f.write("28\n")
+            f.write("29\n")
+            f.write("30\n")
+            f.write("31\n")
+            f.write("32\n")
+            f.write("33\n")
+            f.write("34\n")
+            f.write("35a 8888 value\n")
+            f.write("35b\n")
+            f.write("35c checking savings\n")
+            f.write("35d\n")
+            f.write("36\n")
+            f.write("37\n")
+            f.write("38\n")
+
+            f.write("other_designee y n name phone pin\n")
+
+            f.write("self" + occupation_pin + "\n")
+            f.write("spouse" + occupation_pin + "\n")
+            f.write("phone\n")
+            f.write("email\n")
+
+            f.write("preparer_name\n")
+            f.write("ptin\n")
+            f.write("self_employed\n")
+            f.write("firm_name\n")
+            f.write("firm_phone\n")
+            f.write("firm_address\n")
+            f.write("firm_ein\n")
+        elif year_folder in ["2023", "2024"]:
+            f.write("beginning\n")
+            f.write("ending\n")
+            f.write("end_year\n")
+
+            f.write("self" + first_last_ssn + "\n")
+            f.write("spouse" + first_last_ssn + "\n")
+            f.write("address\n")
+            f.write("apt\n")
+
+            f.write("city\n")
+            f.write("state\n")
+            f.write("zip\n")
+
+            f.write("foreign country province postal\n")
+
+            # f.write("full_year_health_coverage_or_exempt\n")
+            f.write("presidential_election self spouse\n")
+            if year_folder in ["2023"]:
+                f.write("single\n")
+                f.write("married_filling_jointly\n")
+                f.write("married_filling_separately\n")
+                f.write("head_of_household\n")
+                f.write("qualifying_widower\n")
+                f.write("qualifying_name\n")
+            elif year_folder in ["2024"]:
+                f.write("single\n")
+                f.write("married_filling_jointly\n")
+                # f.write("head_of_household\n") -> same as single
+                f.write("married_filling_separately\n")
+                # f.write("qualifying_widower\n") -> same as jointly
+                f.write("qualifying_name\n")
+                f.write("alien\n")
+                f.write("alien_name\n")
+            f.write("virtual_currency y n\n")
+
+            f.write("can_be_claimed_as_dependent self spouse\n")
+            f.write("spouse_itemizes_on_separate_or_dual_status_alien\n")
+
+            f.write("self born_before_19560102 blind\n")
+            f.write("spouse born_before_19560102 blind\n")
+
+            f.write("more_than_four_dependents\n")
+
+            for i in range(1, 5):
+                f.write("dependent_" + str(i) + dependents + "\n")
+
+            f.write("1 a b c d e f g h i z\n")
+            f.write("2 a b\n")
+            f.write("3 a b\n")
+            f.write("4 a b\n")
+            f.write("5 a b\n")
+            f.write("6 a b c\n")
+            f.write("7 n value\n")
+            f.write("8\n")
+            f.write("9\n")
+            f.write("10\n")
+            f.write("11\n")
+            f.write("12\n")
+            f.write("13\n")
+            f.write("14\n")
+            f.write("15\n")
+            f.write("16 1 2 3 3_value\n")
+            f.write("16\n")
+            f.write("17\n")
+            f.write("18\n")
+            f.write("19\n")
+            f.write("20\n")
+            f.write("21\n")
+            f.write("22\n")
+            f.write("23\n")
+            f.write("24\n")
+            f.write("25 a b c d\n")
+            f.write("26\n")
+            f.write("27\n")
+            f.write("28\n")
+            f.write("29\n")
+            f.write("30\n")
+            f.write("31\n")
+            f.write("32\n")
+            f.write("33\n")
+            f.write("34\n")
+            f.write("35a 8888 value\n")
+            f.write("35b\n")
+            f.write("35c checking savings\n")
+            f.write("35d\n")
+            f.write("36\n")
+            f.write("37\n")
+            f.write("38\n")
+
+            f.write("other_designee y n name phone pin\n")
+
+            f.write("self" + occupation_pin + "\n")
+            f.write("spouse" + occupation_pin + "\n")
+            f.write("phone\n")
+            f.write("email\n")
+
+            f.write("preparer_name\n")
+            f.write("ptin\n")
+            f.write("self_employed\n")
+            f.write("firm_name\n")
+            f.write("firm_phone\n")
+            f.write("firm_address\n")
+            f.write("firm_ein\n")
+        else:
+            logger.error(f"Fillkeys  keys not defined for {u}")
+    elif "f1040s1" in u:
+        f.write("name\n")
+        f.write("ssn\n")
+        if year_folder == "2018":
+            f.write("1_9b" + dollar_cents + "\n")
+            for i in range(10, 13):
+                f.write(str(i) + dollar_cents + "\n")
+            f.write("13_not_d\n")
+            for i in range(13, 21):
+                f.write(str(i) + dollar_cents + "\n")
+            f.write("21_type\n")
+            for i in range(21, 31):
+                f.write(str(i) + dollar_cents + "\n")
+            f.write("31b\n")
+            f.write("31a" + dollar_cents + "\n")
+            for i in range(32, 37):
+                f.write(str(i) + dollar_cents + "\n")
+        elif year_folder == "2019" or year_folder == "2020":
+            if year_folder == "2019":
+                f.write("virtual_currency y n\n")
+            f.write("1\n")
+            f.write("2 a b\n")
+            for i in range(3, 8):
+                f.write(f"{i}\n")
+            f.write("8 type1 type2 amount\n")
+            for i in range(9, 18):
+                f.write(f"{i}\n")
+            f.write("18 a b c\n")
+            for i in range(19, 23):
+                f.write(f"{i}\n")
+        elif year_folder == "2021":
+            f.write("1\n")
+            f.write("2 a b\n")
+            for i in range(3, 8):
+                f.write(f"{i}\n")
+            f.write("8 a b c d e f g h i j k l m n o p z_type1 z_type2 z_amount\n")
+            for i in range(9, 19):
+                f.write(f"{i}\n")
+            f.write("19 a b c\n")
+            for i in range(20, 24):
+                f.write(f"{i}\n")
+            f.write("24 a b c d e f g h i j k z_type z_amount z\n")
+            f.write("25\n")
+            f.write("26\n")
+        elif year_folder in ["2022", "2023", "2024"]:
+            f.write("1\n")
+            f.write("2 a b\n")
+            for i in range(3, 8):
+                f.write(f"{i}\n")
+            f.write("8 a b c d e f g h i j k l m n o p q r s t u z_type1 z_type2 z_amount\n")
+            for i in range(9, 19):
+                f.write(f"{i}\n")
+            f.write("19 a b c\n")
+            for i in range(20, 24):
+                f.write(f"{i}\n")
+            f.write("24 a b c d e f g h i j k z_type z_amount z\n")
+            f.write("25\n")
+            f.write("26\n")
+    elif "f1040s2" in u:
+        f.write("name\n")
+        f.write("ssn\n")
+        if year_folder == "2020":
+            for i in range(1, 5):
+                f.write(f"{i}\n")
+            f.write("5 a b value\n")
+            f.write("6\n")
+            f.write("7 a b\n")
+            f.write("8 a b c code value\n")
+            f.write("9\n")
+            f.write("10\n")
+        elif year_folder == "2021":
+            for i in range(1, 17):
+                f.write(f"{i}\n")
+            f.write("17 a_value a b c d e f g h i j k l m n o p q z_type1 z_type2 z_amount\n")
+            for i in range(18, 22):
+                f.write(f"{i}\n")
+        elif year_folder in ["2022", "2023", "2024"]:
+            for i in range(1, 8):
+                f.write(f"{i}\n")
+            f.write("8 check value\n")
+            for i in range(9, 17):
+                f.write(f"{i}\n")
+            f.write("17 a_value a b c d e f g h i j k l m n o p q z_type1 z_type2 z_amount\n")
+            for i in range(18, 22):
+                f.write(f"{i}\n")
+    elif "f1040s3" in u:
+        f.write("name\n")
+        f.write("ssn\n")
+
+        if year_folder == "2018":
+            for i in range(48, 54):
+                f.write(str(i) + dollar_cents + "\n")
+            f.write("54 a b c c_value\n")
+            for i in range(54, 56):
+                f.write(str(i) + dollar_cents + "\n")
+        elif year_folder == "2019":
+            for i in range(1, 6):
+                f.write(f"{i}\n")
+            f.write("6 a b c c_value\n")
+            for i in range(6, 13):
+                f.write(f"{i}\n")
+            f.write("13 a b c d d_value\n")
+            for i in range(13, 15):
+                f.write(f"{i}\n")
+        elif year_folder == "2020":
+            for i in range(1, 6):
+                f.write(f"{i}\n")
+            f.write("6 a b c c_value\n")
+            for i in range(6, 12):
+                f.write(f"{i}\n")
+            f.write("12 a b c d d_value e f\n")
+            f.write("13\n")
+        elif year_folder == "2021":
+            for i in range(1, 6):
+                f.write(f"{i}\n")
+            f.write("6 a b c d e f g h i j k l z_type1 z_type2 z_amount\n")
+            for i in range(7, 13):
+                f.write(f"{i}\n")
+            f.write("13 a b c d e f g h z_type1 z_type2 z_amount\n")
+            f.write("14\n")
+            f.write("15\n")
+        elif year_folder == "2022":
+            for i in range(1, 6):
+                f.write(f"{i}\n")
+            f.write("6 a b c d e f g h i j k l z_type1 z_type2 z_amount\n")
+            for i in range(7, 13):
+                f.write(f"{i}\n")
+            f.write("13 a b c d e f g h z_type z_amount\n")
+            f.write("14\n")
+            f.write("15\n")
+        elif year_folder in ["2023", "2024"]:
+            for i in range(1, 5):
+                f.write(f"{i}\n")
+            f.write("5 a b\n")
+            f.write("6 a b c d e f g h i j k l m z_type1 z_type2 z_amount\n")
+            for i in range(7, 13):
+                f.write(f"{i}\n")
+            f.write("13 a b c d z_type z_amount\n")
+            f.write("14\n")
+            f.write("15\n")
+    elif "f1040sa" in u:
+        f.write("name\n")
+        f.write("ssn\n")
+        for i in range(1, 5):
+            f.write(f"{i}\n")
+        f.write("5 a_y a b c d e\n")
+        f.write("6 type1 type2 amount\n")
+        f.write("7\n")
+        f.write("8 y a b_type1 b_type2 b_amount c d e\n")
+        for i in range(9, 16):
+            f.write(f"{i}\n")
+        f.write("16 type1 type2 type3 amount\n")
+        f.write("17\n")
+        f.write("18\n")
+    elif "f1040sb" in u:
+        if int(year_folder) < 2022:
+            f.write("name\n")
+            f.write("ssn\n")
+            for i in range(1, 15):
+                f.write("1_" + str(i) + payer_dollar_cents + "\n")
+            for i in range(2, 5):
+                f.write(str(i) + dollar_cents + "\n")
+            for i in range(1, 17):
+                f.write("5_" + str(i) + payer_dollar_cents + "\n")
+            f.write("6" + dollar_cents + "\n")
+            for i in ["7a", "7a_yes"]:
+                f.write(i + yes_no + "\n")
+            f.write("7b\n")
+            f.write("8" + yes_no + "\n")
+        elif year_folder in ["2022", "2023", "2024"]:
+            f.write("name\n")
+            f.write("ssn\n")
+            for i in range(1, 15):
+                f.write("1_" + str(i) + payer_dollar_cents + "\n")
+            for i in range(2, 5):
+                f.write(str(i) + dollar_cents + "\n")
+            for i in range(1, 16):
+                f.write("5_" + str(i) + payer_dollar_cents + "\n")
+            f.write("6" + dollar_cents + "\n")
+            for i in ["7a", "7a_yes"]:
+                f.write(i + yes_no + "\n")
+            f.write("7b 1 2\n")
+            f.write("8" + yes_no + "\n")
+    elif "f1040sd" in u:
+        f.write("name\n")
+        f.write("ssn\n")
+
+        if year_folder in ["2019", "2020", "2021", "2022", "2023", "2024"]:
+            f.write("dispose_opportunity y n\n")
+
+        for i in ['1a', '1b', '2', '3']:
+            f.write(i + proceeds_columns + "\n")
+        for i in range(4, 8):
+            f.write(str(i) + "\n")
+        for i in ['8a', '8b', '9', '10']:
+            f.write(i + proceeds_columns + "\n")
+        for i in range(11, 17):
+            f.write(str(i) + "\n")
+        f.write("17" + yes_no + "\n")
+        for i in range(18, 20):
+            f.write(str(i) + "\n")
+        f.write("20" + yes_no + "\n")
+        f.write("21\n")
+        f.write("22" + yes_no + "\n")
+    elif "f6251" in u:
+        f.write("name\n")
+        f.write("ssn\n")
+        lines = ['1']
+        for i in range(20):
+            lines.append("2" + chr(ord('a') + i))
+        for i in range(3, 41):
+            lines.append(str(i))
+        for line in lines:
+            f.write(line + dollar_cents + "\n")
+    elif "f6781" in u:
+        f.write("name\n")
+        f.write("ssn\n")
+        f.write("A\n")
+        f.write("B\n")
+        f.write("C\n")
+        f.write("D\n")
+        f.write("1_1 a b c\n")
+        f.write("1_2 a b c\n")
+        f.write("1_3 a b c\n")
+        f.write("2 b c\n")
+        for i in range(3, 10):
+            f.write(f"{i}\n")
+        f.write("10_1 a b c d e f g h\n")
+        f.write("10_2 a b c d e f g h\n")
+        f.write("11 a b\n")
+        f.write("12_1 a b c d e f\n")
+        f.write("12_2 a b c d e f\n")
+        f.write("13 a b\n")
+        f.write("14_1 a b c d e\n")
+        f.write("14_2 a b c d e\n")
+        f.write("14_3 a b c d e\n")
+    elif "f8889" in u:
+        f.write("name\n")
+        f.write("ssn\n")
+        f.write("1 self family\n")
+        for i in range(2, 14):
+            f.write(f"{i}\n")
+        f.write("14 a b c\n")
+        f.write("15\n")
+        f.write("16\n")
+        f.write("17 a b\n")
+        for i in range(18, 22):
+            f.write(f"{i}\n")
+    elif "f8949" in u:
+        f.write("I_name\n")
+        f.write("I_ssn\n")
+        f.write("short" + " a b c" + "\n")
+        for i in range(14):
+            f.write("I_1_" + str(i + 1) + full_trade + "\n")
+        f.write("I_2" + trade + "\n")
+        f.write("II_name\n")
+        f.write("II_ssn\n")
+        f.write("long" + " d e f" + "\n")
+        for i in range(14):
+            f.write("II_1_" + str(i + 1) + full_trade + "\n")
+        f.write("II_2" + trade + "\n")
+    elif "f8959" in u:
+        f.write("name\n")
+        f.write("ssn\n")
+        for i in range(1, 25):
+            f.write(f"{i}\n")
+    elif "it196_fill_in" in u:
+        # ssn and tick boxes are not marked
+        f.write("name\n")
+        for i in range(1, 8):
+            f.write(f"{i}\n")
+        f.write(f"8 a b\n")
+        for i in range(8, 11):
+            f.write(f"{i}\n")
+        f.write(f"11 a b\n")
+        for i in range(11, 13):
+            f.write(f"{i}\n")
+        for i in range(14, 16):
+            f.write(f"{i}\n")
+        f.write(f"16_a\n")
+        for i in range(16, 24):
+            f.write(f"{i}\n")
+        f.write(f"24 a b\n")
+        for i in range(24, 50):
+            f.write(f"{i}\n")
+    else:
+        logger.error("Fields File not defined %s", u)
+    return f.getvalue()
+
+
+def fill_fields_files(year_folder, folders=default_keys_folders):
+    year_fields_name = os.path.join(folders.fields_mapping, year_folder)
     for u in glob.glob(os.path.join(year_fields_name, "*", "*" + fields_extension)):
         logger.info("Filling fields %s", u)
+        text = fields_definition(u, year_folder)
         with open(u, 'w') as f:
-            if "f1040." in u:
-                if year_folder == "2018":
-                    f.write("single\n")
-                    f.write("married_filling_jointly\n")
-                    f.write("married_filling_separately\n")
-                    f.write("head_of_household\n")
-                    f.write("qualifying_widower\n")
-                    f.write("qualifying_widower_name\n")
-                    f.write("self" + first_last_ssn + "\n")
-
-                    standard_deduction = " can_be_claimed_as_dependent_y" \
-                                         " born_before_19540102_y" \
-                                         " blind"
-
-                    f.write("self" + standard_deduction + "\n")
-                    f.write("spouse" + first_last_ssn + "\n")
-                    f.write("spouse" + standard_deduction + "\n")  # check order for accuracy
-                    f.write("spouse_itemizes_on_separate_or_dual_status_alien\n")
-                    f.write("address\n")
-                    f.write("apt\n")
-                    f.write("city_state_zip\n")
-                    f.write("full_year_health_coverage_or_exempt\n")
-                    f.write("presidential_election self spouse\n")
-                    f.write("more_than_four_dependents\n")
-                    for i in range(1, 5):
-                        f.write("dependent_" + str(i) + dependents + "\n")
-                    f.write("self" + occupation_pin + "\n")
-                    f.write("spouse" + occupation_pin + "\n")
-                    f.write("preparer_name\n")
-                    f.write("ptin\n")
-                    f.write("firm_ein\n")
-                    f.write("firm_name\n")
-                    f.write("firm_phone\n")
-                    f.write("third_party_designee\n")
-                    f.write("self_employed\n")
-                    f.write("firm_address\n")
-
-                    lines = ['1']
-                    for i in range(2, 6):
-                        for j in range(2):
-                            lines.append(str(i) + chr(ord('a') + j))
-                    for l in lines:
-                        f.write(l + dollar_cents + "\n")
-                    f.write("6_from_s1_22\n")
-                    for i in range(6, 11):
-                        f.write(str(i) + dollar_cents + "\n")
-                    f.write("11a tax 1 2 3 3_value\n")
-                    f.write("11b\n")
-                    f.write("11" + dollar_cents + "\n")
-                    f.write("12a\n")
-                    f.write("12b\n")
-                    for i in range(12, 17):
-                        f.write(str(i) + dollar_cents + "\n")
-                    f.write("17a\n")
-                    f.write("17b\n")
-                    f.write("17c\n")
-                    f.write("17_from_5\n")
-                    for i in range(17, 20):
-                        f.write(str(i) + dollar_cents + "\n")
-                    f.write("20a 8888" + dollar_cents + "\n")
-                    f.write("20b\n")
-                    f.write("20c checking savings\n")
-                    f.write("20d\n")
-                    for i in range(21, 24):
-                        f.write(str(i) + dollar_cents + "\n")
-                elif year_folder == "2019":
-                    f.write("single\n")
-                    f.write("married_filling_jointly\n")
-                    f.write("married_filling_separately\n")
-                    f.write("head_of_household\n")
-                    f.write("qualifying_widower\n")
-                    f.write("qualifying_name\n")
-                    f.write("self" + first_last_ssn + "\n")
-                    f.write("spouse" + first_last_ssn + "\n")
-                    f.write("address\n")
-                    f.write("apt\n")
-                    f.write("city_state_zip\n")
-
-                    f.write("foreign country province postal\n")
-
-                    # f.write("full_year_health_coverage_or_exempt\n")
-                    f.write("presidential_election self spouse\n")
-                    f.write("more_than_four_dependents\n")
-
-                    f.write("can_be_claimed_as_dependent self spouse\n")
-                    f.write("spouse_itemizes_on_separate_or_dual_status_alien\n")
-                    f.write("born_before_19550102 self spouse\n")
-                    f.write("blind self spouse\n")
-
-                    for i in range(1, 5):
-                        f.write("dependent_" + str(i) + dependents + "\n")
-
-                    f.write("1\n")
-                    f.write("2 a b\n")
-                    f.write("3 a b\n")
-                    f.write("4 a b c d\n")
-                    f.write("5 a b\n")
-                    f.write("6 n value\n")
-                    f.write("7 a b\n")
-                    f.write("8 a b\n")
-                    f.write("9\n")
-                    f.write("10\n")
-                    f.write("11 a b\n")
-                    f.write("12a 1 2 3 3_value\n")
-                    f.write("12 a b\n")
-                    f.write("13 a b\n")
-                    f.write("14\n")
-                    f.write("15\n")
-                    f.write("16\n")
-                    f.write("17\n")
-                    f.write("18 a b c d e\n")
-                    f.write("19\n")
-                    f.write("20\n")
-
-                    f.write("21a 8888 value\n")
-                    f.write("21b\n")
-                    f.write("21c checking savings\n")
-                    f.write("21d\n")
-                    for i in range(22, 25):
-                        f.write(str(i) + "\n")
-
-                    f.write("other_designee y n name phone pin\n")
-
-                    f.write("self" + occupation_pin + "\n")
-                    f.write("spouse" + occupation_pin + "\n")
-                    f.write("phone\n")
-                    f.write("email\n")
-
-                    f.write("preparer_name\n")
-                    f.write("ptin\n")
-                    f.write("third_party_designee\n")
-                    f.write("firm_name\n")
-                    f.write("firm_phone\n")
-                    f.write("self_employed\n")
-                    f.write("firm_address\n")
-                    f.write("firm_ein\n")
-                elif year_folder == "2020":
-                    f.write("single\n")
-                    f.write("married_filling_jointly\n")
-                    f.write("married_filling_separately\n")
-                    f.write("head_of_household\n")
-                    f.write("qualifying_widower\n")
-                    f.write("qualifying_name\n")
-                    f.write("self" + first_last_ssn + "\n")
-                    f.write("spouse" + first_last_ssn + "\n")
-                    f.write("address\n")
-                    f.write("apt\n")
-
-                    f.write("city\n")
-                    f.write("state\n")
-                    f.write("zip\n")
-
-                    f.write("foreign country province postal\n")
-
-                    # f.write("full_year_health_coverage_or_exempt\n")
-                    f.write("presidential_election self spouse\n")
-                    f.write("virtual_currency y n\n")
-
-                    f.write("can_be_claimed_as_dependent self spouse\n")
-                    f.write("spouse_itemizes_on_separate_or_dual_status_alien\n")
-
-                    f.write("self born_before_19560102 blind\n")
-                    f.write("spouse born_before_19560102 blind\n")
-
-                    f.write("more_than_four_dependents\n")
-
-                    for i in range(1, 5):
-                        f.write("dependent_" + str(i) + dependents + "\n")
-
-                    f.write("1\n")
-                    f.write("2 a b\n")
-                    f.write("3 a b\n")
-                    f.write("4 a b\n")
-                    f.write("5 a b\n")
-                    f.write("6 a b\n")
-                    f.write("7 n value\n")
-                    f.write("8\n")
-                    f.write("9\n")
-                    f.write("10 a b c\n")
-                    f.write("11\n")
-                    f.write("12\n")
-                    f.write("13\n")
-                    f.write("14\n")
-                    f.write("15\n")
-                    f.write("16 1 2 3 3_value\n")
-                    f.write("16\n")
-                    f.write("17\n")
-                    f.write("18\n")
-                    f.write("19\n")
-                    f.write("20\n")
-                    f.write("21\n")
-                    f.write("22\n")
-                    f.write("23\n")
-                    f.write("24\n")
-                    f.write("25 a b c d\n")
-                    f.write("26\n")
-                    f.write("27\n")
-                    f.write("28\n")
-                    f.write("29\n")
-                    f.write("30\n")
-                    f.write("31\n")
-                    f.write("32\n")
-                    f.write("33\n")
-                    f.write("34\n")
-                    f.write("35a 8888 value\n")
-                    f.write("35b\n")
-                    f.write("35c checking savings\n")
-                    f.write("35d\n")
-                    f.write("36\n")
-                    f.write("37\n")
-                    f.write("38\n")
-
-                    f.write("other_designee y n name phone pin\n")
-
-                    f.write("self" + occupation_pin + "\n")
-                    f.write("spouse" + occupation_pin + "\n")
-                    f.write("phone\n")
-                    f.write("email\n")
-
-                    f.write("preparer_name\n")
-                    f.write("ptin\n")
-                    f.write("self_employed\n")
-                    f.write("firm_name\n")
-                    f.write("firm_phone\n")
-                    f.write("firm_address\n")
-                    f.write("firm_ein\n")
-                elif year_folder == "2021":
-                    f.write("single\n")
-                    f.write("married_filling_jointly\n")
-                    f.write("married_filling_separately\n")
-                    f.write("head_of_household\n")
-                    f.write("qualifying_widower\n")
-                    f.write("qualifying_name\n")
-                    f.write("self" + first_last_ssn + "\n")
-                    f.write("spouse" + first_last_ssn + "\n")
-                    f.write("address\n")
-                    f.write("apt\n")
-
-                    f.write("city\n")
-                    f.write("state\n")
-                    f.write("zip\n")
-
-                    f.write("foreign country province postal\n")
-
-                    # f.write("full_year_health_coverage_or_exempt\n")
-                    f.write("presidential_election self spouse\n")
-                    f.write("virtual_currency y n\n")
-
-                    f.write("can_be_claimed_as_dependent self spouse\n")
-                    f.write("spouse_itemizes_on_separate_or_dual_status_alien\n")
-
-                    f.write("self born_before_19560102 blind\n")
-                    f.write("spouse born_before_19560102 blind\n")
-
-                    f.write("more_than_four_dependents\n")
-
-                    for i in range(1, 5):
-                        f.write("dependent_" + str(i) + dependents + "\n")
-
-                    f.write("1\n")
-                    f.write("2 a b\n")
-                    f.write("3 a b\n")
-                    f.write("4 a b\n")
-                    f.write("5 a b\n")
-                    f.write("6 a b\n")
-                    f.write("7 n value\n")
-                    f.write("8\n")
-                    f.write("9\n")
-                    f.write("10\n")
-                    f.write("11\n")
-                    f.write("12 a b c\n")
-                    f.write("13\n")
-                    f.write("14\n")
-                    f.write("15\n")
-                    f.write("16 1 2 3 3_value\n")
-                    f.write("16\n")
-                    f.write("17\n")
-                    f.write("18\n")
-                    f.write("19\n")
-                    f.write("20\n")
-                    f.write("21\n")
-                    f.write("22\n")
-                    f.write("23\n")
-                    f.write("24\n")
-                    f.write("25 a b c d\n")
-                    f.write("26\n")
-                    f.write("27 a check b c\n")
-                    f.write("28\n")
-                    f.write("29\n")
-                    f.write("30\n")
-                    f.write("31\n")
-                    f.write("32\n")
-                    f.write("33\n")
-                    f.write("34\n")
-                    f.write("35a 8888 value\n")
-                    f.write("35b\n")
-                    f.write("35c checking savings\n")
-                    f.write("35d\n")
-                    f.write("36\n")
-                    f.write("37\n")
-                    f.write("38\n")
-
-                    f.write("other_designee y n name phone pin\n")
-
-                    f.write("self" + occupation_pin + "\n")
-                    f.write("spouse" + occupation_pin + "\n")
-                    f.write("phone\n")
-                    f.write("email\n")
-
-                    f.write("preparer_name\n")
-                    f.write("ptin\n")
-                    f.write("self_employed\n")
-                    f.write("firm_name\n")
-                    f.write("firm_phone\n")
-                    f.write("firm_address\n")
-                    f.write("firm_ein\n")
-                elif year_folder == "2022":
-                    f.write("single\n")
-                    f.write("married_filling_jointly\n")
-                    f.write("married_filling_separately\n")
-                    f.write("head_of_household\n")
-                    f.write("qualifying_widower\n")
-                    f.write("qualifying_name\n")
-                    f.write("self" + first_last_ssn + "\n")
-                    f.write("spouse" + first_last_ssn + "\n")
-                    f.write("address\n")
-                    f.write("apt\n")
-
-                    f.write("city\n")
-                    f.write("state\n")
-                    f.write("zip\n")
-
-                    f.write("foreign country province postal\n")
-
-                    # f.write("full_year_health_coverage_or_exempt\n")
-                    f.write("presidential_election self spouse\n")
-                    f.write("virtual_currency y n\n")
-
-                    f.write("can_be_claimed_as_dependent self spouse\n")
-                    f.write("spouse_itemizes_on_separate_or_dual_status_alien\n")
-
-                    f.write("self born_before_19560102 blind\n")
-                    f.write("spouse born_before_19560102 blind\n")
-
-                    f.write("more_than_four_dependents\n")
-
-                    for i in range(1, 5):
-                        f.write("dependent_" + str(i) + dependents + "\n")
-
-                    f.write("1 a b c d e f g h i z\n")
-                    f.write("2 a b\n")
-                    f.write("3 a b\n")
-                    f.write("4 a b\n")
-                    f.write("5 a b\n")
-                    f.write("6 a b c\n")
-                    f.write("7 n value\n")
-                    f.write("8\n")
-                    f.write("9\n")
-                    f.write("10\n")
-                    f.write("11\n")
-                    f.write("12\n")
-                    f.write("13\n")
-                    f.write("14\n")
-                    f.write("15\n")
-                    f.write("16 1 2 3 3_value\n")
-                    f.write("16\n")
-                    f.write("17\n")
-                    f.write("18\n")
-                    f.write("19\n")
-                    f.write("20\n")
-                    f.write("21\n")
-                    f.write("22\n")
-                    f.write("23\n")
-                    f.write("24\n")
-                    f.write("25 a b c d\n")
-                    f.write("26\n")
-                    f.write("27\n")
-                    f.write("28\n")
-                    f.write("29\n")
-                    f.write("30\n")
-                    f.write("31\n")
-                    f.write("32\n")
-                    f.write("33\n")
-                    f.write("34\n")
-                    f.write("35a 8888 value\n")
-                    f.write("35b\n")
-                    f.write("35c checking savings\n")
-                    f.write("35d\n")
-                    f.write("36\n")
-                    f.write("37\n")
-                    f.write("38\n")
-
-                    f.write("other_designee y n name phone pin\n")
-
-                    f.write("self" + occupation_pin + "\n")
-                    f.write("spouse" + occupation_pin + "\n")
-                    f.write("phone\n")
-                    f.write("email\n")
-
-                    f.write("preparer_name\n")
-                    f.write("ptin\n")
-                    f.write("self_employed\n")
-                    f.write("firm_name\n")
-                    f.write("firm_phone\n")
-                    f.write("firm_address\n")
-                    f.write("firm_ein\n")
-                elif year_folder in ["2023", "2024"]:
-                    f.write("beginning\n")
-                    f.write("ending\n")
-                    f.write("end_year\n")
-
-                    f.write("self" + first_last_ssn + "\n")
-                    f.write("spouse" + first_last_ssn + "\n")
-                    f.write("address\n")
-                    f.write("apt\n")
-
-                    f.write("city\n")
-                    f.write("state\n")
-                    f.write("zip\n")
-
-                    f.write("foreign country province postal\n")
-
-                    # f.write("full_year_health_coverage_or_exempt\n")
-                    f.write("presidential_election self spouse\n")
-                    if year_folder in ["2023"]:
-                        f.write("single\n")
-                        f.write("married_filling_jointly\n")
-                        f.write("married_filling_separately\n")
-                        f.write("head_of_household\n")
-                        f.write("qualifying_widower\n")
-                        f.write("qualifying_name\n")
-                    elif year_folder in ["2024"]:
-                        f.write("single\n")
-                        f.write("married_filling_jointly\n")
-                        # f.write("head_of_household\n") -> same as single
-                        f.write("married_filling_separately\n")
-                        # f.write("qualifying_widower\n") -> same as jointly
-                        f.write("qualifying_name\n")
-                        f.write("alien\n")
-                        f.write("alien_name\n")
-                    f.write("virtual_currency y n\n")
-
-                    f.write("can_be_claimed_as_dependent self spouse\n")
-                    f.write("spouse_itemizes_on_separate_or_dual_status_alien\n")
-
-                    f.write("self born_before_19560102 blind\n")
-                    f.write("spouse born_before_19560102 blind\n")
-
-                    f.write("more_than_four_dependents\n")
-
-                    for i in range(1, 5):
-                        f.write("dependent_" + str(i) + dependents + "\n")
-
-                    f.write("1 a b c d e f g h i z\n")
-                    f.write("2 a b\n")
-                    f.write("3 a b\n")
-                    f.write("4 a b\n")
-                    f.write("5 a b\n")
-                    f.write("6 a b c\n")
-                    f.write("7 n value\n")
-                    f.write("8\n")
-                    f.write("9\n")
-                    f.write("10\n")
-                    f.write("11\n")
-                    f.write("12\n")
-                    f.write("13\n")
-                    f.write("14\n")
-                    f.write("15\n")
-                    f.write("16 1 2 3 3_value\n")
-                    f.write("16\n")
-                    f.write("17\n")
-                    f.write("18\n")
-                    f.write("19\n")
-                    f.write("20\n")
-                    f.write("21\n")
-                    f.write("22\n")
-                    f.write("23\n")
-                    f.write("24\n")
-                    f.write("25 a b c d\n")
-                    f.write("26\n")
-                    f.write("27\n")
-                    f.write("28\n")
-                    f.write("29\n")
-                    f.write("30\n")
-                    f.write("31\n")
-                    f.write("32\n")
-                    f.write("33\n")
-                    f.write("34\n")
-                    f.write("35a 8888 value\n")
-                    f.write("35b\n")
-                    f.write("35c checking savings\n")
-                    f.write("35d\n")
-                    f.write("36\n")
-                    f.write("37\n")
-                    f.write("38\n")
-
-                    f.write("other_designee y n name phone pin\n")
-
-                    f.write("self" + occupation_pin + "\n")
-                    f.write("spouse" + occupation_pin + "\n")
-                    f.write("phone\n")
-                    f.write("email\n")
-
-                    f.write("preparer_name\n")
-                    f.write("ptin\n")
-                    f.write("self_employed\n")
-                    f.write("firm_name\n")
-                    f.write("firm_phone\n")
-                    f.write("firm_address\n")
-                    f.write("firm_ein\n")
-                else:
-                    logger.error(f"Fillkeys  keys not defined for {u}")
-            elif "f1040s1" in u:
-                f.write("name\n")
-                f.write("ssn\n")
-                if year_folder == "2018":
-                    f.write("1_9b" + dollar_cents + "\n")
-                    for i in range(10, 13):
-                        f.write(str(i) + dollar_cents + "\n")
-                    f.write("13_not_d\n")
-                    for i in range(13, 21):
-                        f.write(str(i) + dollar_cents + "\n")
-                    f.write("21_type\n")
-                    for i in range(21, 31):
-                        f.write(str(i) + dollar_cents + "\n")
-                    f.write("31b\n")
-                    f.write("31a" + dollar_cents + "\n")
-                    for i in range(32, 37):
-                        f.write(str(i) + dollar_cents + "\n")
-                elif year_folder == "2019" or year_folder == "2020":
-                    if year_folder == "2019":
-                        f.write("virtual_currency y n\n")
-                    f.write("1\n")
-                    f.write("2 a b\n")
-                    for i in range(3, 8):
-                        f.write(f"{i}\n")
-                    f.write("8 type1 type2 amount\n")
-                    for i in range(9, 18):
-                        f.write(f"{i}\n")
-                    f.write("18 a b c\n")
-                    for i in range(19, 23):
-                        f.write(f"{i}\n")
-                elif year_folder == "2021":
-                    f.write("1\n")
-                    f.write("2 a b\n")
-                    for i in range(3, 8):
-                        f.write(f"{i}\n")
-                    f.write("8 a b c d e f g h i j k l m n o p z_type1 z_type2 z_amount\n")
-                    for i in range(9, 19):
-                        f.write(f"{i}\n")
-                    f.write("19 a b c\n")
-                    for i in range(20, 24):
-                        f.write(f"{i}\n")
-                    f.write("24 a b c d e f g h i j k z_type z_amount z\n")
-                    f.write("25\n")
-                    f.write("26\n")
-                elif year_folder in ["2022", "2023", "2024"]:
-                    f.write("1\n")
-                    f.write("2 a b\n")
-                    for i in range(3, 8):
-                        f.write(f"{i}\n")
-                    f.write("8 a b c d e f g h i j k l m n o p q r s t u z_type1 z_type2 z_amount\n")
-                    for i in range(9, 19):
-                        f.write(f"{i}\n")
-                    f.write("19 a b c\n")
-                    for i in range(20, 24):
-                        f.write(f"{i}\n")
-                    f.write("24 a b c d e f g h i j k z_type z_amount z\n")
-                    f.write("25\n")
-                    f.write("26\n")
-            elif "f1040s2" in u:
-                f.write("name\n")
-                f.write("ssn\n")
-                if year_folder == "2020":
-                    for i in range(1, 5):
-                        f.write(f"{i}\n")
-                    f.write("5 a b value\n")
-                    f.write("6\n")
-                    f.write("7 a b\n")
-                    f.write("8 a b c code value\n")
-                    f.write("9\n")
-                    f.write("10\n")
-                elif year_folder == "2021":
-                    for i in range(1, 17):
-                        f.write(f"{i}\n")
-                    f.write("17 a_value a b c d e f g h i j k l m n o p q z_type1 z_type2 z_amount\n")
-                    for i in range(18, 22):
-                        f.write(f"{i}\n")
-                elif year_folder in ["2022", "2023", "2024"]:
-                    for i in range(1, 8):
-                        f.write(f"{i}\n")
-                    f.write("8 check value\n")
-                    for i in range(9, 17):
-                        f.write(f"{i}\n")
-                    f.write("17 a_value a b c d e f g h i j k l m n o p q z_type1 z_type2 z_amount\n")
-                    for i in range(18, 22):
-                        f.write(f"{i}\n")
-            elif "f1040s3" in u:
-                f.write("name\n")
-                f.write("ssn\n")
-
-                if year_folder == "2018":
-                    for i in range(48, 54):
-                        f.write(str(i) + dollar_cents + "\n")
-                    f.write("54 a b c c_value\n")
-                    for i in range(54, 56):
-                        f.write(str(i) + dollar_cents + "\n")
-                elif year_folder == "2019":
-                    for i in range(1, 6):
-                        f.write(f"{i}\n")
-                    f.write("6 a b c c_value\n")
-                    for i in range(6, 13):
-                        f.write(f"{i}\n")
-                    f.write("13 a b c d d_value\n")
-                    for i in range(13, 15):
-                        f.write(f"{i}\n")
-                elif year_folder == "2020":
-                    for i in range(1, 6):
-                        f.write(f"{i}\n")
-                    f.write("6 a b c c_value\n")
-                    for i in range(6, 12):
-                        f.write(f"{i}\n")
-                    f.write("12 a b c d d_value e f\n")
-                    f.write("13\n")
-                elif year_folder == "2021":
-                    for i in range(1, 6):
-                        f.write(f"{i}\n")
-                    f.write("6 a b c d e f g h i j k l z_type1 z_type2 z_amount\n")
-                    for i in range(7, 13):
-                        f.write(f"{i}\n")
-                    f.write("13 a b c d e f g h z_type1 z_type2 z_amount\n")
-                    f.write("14\n")
-                    f.write("15\n")
-                elif year_folder == "2022":
-                    for i in range(1, 6):
-                        f.write(f"{i}\n")
-                    f.write("6 a b c d e f g h i j k l z_type1 z_type2 z_amount\n")
-                    for i in range(7, 13):
-                        f.write(f"{i}\n")
-                    f.write("13 a b c d e f g h z_type z_amount\n")
-                    f.write("14\n")
-                    f.write("15\n")
-                elif year_folder in ["2023", "2024"]:
-                    for i in range(1, 5):
-                        f.write(f"{i}\n")
-                    f.write("5 a b\n")
-                    f.write("6 a b c d e f g h i j k l m z_type1 z_type2 z_amount\n")
-                    for i in range(7, 13):
-                        f.write(f"{i}\n")
-                    f.write("13 a b c d z_type z_amount\n")
-                    f.write("14\n")
-                    f.write("15\n")
-            elif "f1040sa" in u:
-                f.write("name\n")
-                f.write("ssn\n")
-                for i in range(1, 5):
-                    f.write(f"{i}\n")
-                f.write("5 a_y a b c d e\n")
-                f.write("6 type1 type2 amount\n")
-                f.write("7\n")
-                f.write("8 y a b_type1 b_type2 b_amount c d e\n")
-                for i in range(9, 16):
-                    f.write(f"{i}\n")
-                f.write("16 type1 type2 type3 amount\n")
-                f.write("17\n")
-                f.write("18\n")
-            elif "f1040sb" in u:
-                if int(year_folder) < 2022:
-                    f.write("name\n")
-                    f.write("ssn\n")
-                    for i in range(1, 15):
-                        f.write("1_" + str(i) + payer_dollar_cents + "\n")
-                    for i in range(2, 5):
-                        f.write(str(i) + dollar_cents + "\n")
-                    for i in range(1, 17):
-                        f.write("5_" + str(i) + payer_dollar_cents + "\n")
-                    f.write("6" + dollar_cents + "\n")
-                    for i in ["7a", "7a_yes"]:
-                        f.write(i + yes_no + "\n")
-                    f.write("7b\n")
-                    f.write("8" + yes_no + "\n")
-                elif year_folder in ["2022", "2023", "2024"]:
-                    f.write("name\n")
-                    f.write("ssn\n")
-                    for i in range(1, 15):
-                        f.write("1_" + str(i) + payer_dollar_cents + "\n")
-                    for i in range(2, 5):
-                        f.write(str(i) + dollar_cents + "\n")
-                    for i in range(1, 16):
-                        f.write("5_" + str(i) + payer_dollar_cents + "\n")
-                    f.write("6" + dollar_cents + "\n")
-                    for i in ["7a", "7a_yes"]:
-                        f.write(i + yes_no + "\n")
-                    f.write("7b 1 2\n")
-                    f.write("8" + yes_no + "\n")
-            elif "f1040sd" in u:
-                f.write("name\n")
-                f.write("ssn\n")
-
-                if year_folder in ["2019", "2020", "2021", "2022", "2023", "2024"]:
-                    f.write("dispose_opportunity y n\n")
-
-                for i in ['1a', '1b', '2', '3']:
-                    f.write(i + proceeds_columns + "\n")
-                for i in range(4, 8):
-                    f.write(str(i) + "\n")
-                for i in ['8a', '8b', '9', '10']:
-                    f.write(i + proceeds_columns + "\n")
-                for i in range(11, 17):
-                    f.write(str(i) + "\n")
-                f.write("17" + yes_no + "\n")
-                for i in range(18, 20):
-                    f.write(str(i) + "\n")
-                f.write("20" + yes_no + "\n")
-                f.write("21\n")
-                f.write("22" + yes_no + "\n")
-            elif "f6251" in u:
-                f.write("name\n")
-                f.write("ssn\n")
-                lines = ['1']
-                for i in range(20):
-                    lines.append("2" + chr(ord('a') + i))
-                for i in range(3, 41):
-                    lines.append(str(i))
-                for line in lines:
-                    f.write(line + dollar_cents + "\n")
-            elif "f6781" in u:
-                f.write("name\n")
-                f.write("ssn\n")
-                f.write("A\n")
-                f.write("B\n")
-                f.write("C\n")
-                f.write("D\n")
-                f.write("1_1 a b c\n")
-                f.write("1_2 a b c\n")
-                f.write("1_3 a b c\n")
-                f.write("2 b c\n")
-                for i in range(3, 10):
-                    f.write(f"{i}\n")
-                f.write("10_1 a b c d e f g h\n")
-                f.write("10_2 a b c d e f g h\n")
-                f.write("11 a b\n")
-                f.write("12_1 a b c d e f\n")
-                f.write("12_2 a b c d e f\n")
-                f.write("13 a b\n")
-                f.write("14_1 a b c d e\n")
-                f.write("14_2 a b c d e\n")
-                f.write("14_3 a b c d e\n")
-            elif "f8889" in u:
-                f.write("name\n")
-                f.write("ssn\n")
-                f.write("1 self family\n")
-                for i in range(2, 14):
-                    f.write(f"{i}\n")
-                f.write("14 a b c\n")
-                f.write("15\n")
-                f.write("16\n")
-                f.write("17 a b\n")
-                for i in range(18, 22):
-                    f.write(f"{i}\n")
-            elif "f8949" in u:
-                f.write("I_name\n")
-                f.write("I_ssn\n")
-                f.write("short" + " a b c" + "\n")
-                for i in range(14):
-                    f.write("I_1_" + str(i + 1) + full_trade + "\n")
-                f.write("I_2" + trade + "\n")
-                f.write("II_name\n")
-                f.write("II_ssn\n")
-                f.write("long" + " d e f" + "\n")
-                for i in range(14):
-                    f.write("II_1_" + str(i + 1) + full_trade + "\n")
-                f.write("II_2" + trade + "\n")
-            elif "f8959" in u:
-                f.write("name\n")
-                f.write("ssn\n")
-                for i in range(1, 25):
-                    f.write(f"{i}\n")
-            elif "it196_fill_in" in u:
-                # ssn and tick boxes are not marked
-                f.write("name\n")
-                for i in range(1, 8):
-                    f.write(f"{i}\n")
-                f.write(f"8 a b\n")
-                for i in range(8, 11):
-                    f.write(f"{i}\n")
-                f.write(f"11 a b\n")
-                for i in range(11, 13):
-                    f.write(f"{i}\n")
-                for i in range(14, 16):
-                    f.write(f"{i}\n")
-                f.write(f"16_a\n")
-                for i in range(16, 24):
-                    f.write(f"{i}\n")
-                f.write(f"24 a b\n")
-                for i in range(24, 50):
-                    f.write(f"{i}\n")
+            f.write(text)
+
+
+def named_keys(commands, keys):
+    # commands are the lines of a fields file, keys the numbered keys in widget order
+    # returns the keys with the numbers replaced by the field names
+    named = []
+    it = iter(keys)
+    try:
+        for command in commands:
+            if " " not in command:
+                # logger.error(command)
+                u = next(it)
+                # logger.error(u)
+                named.append((command.strip(), u[1], u[2]))
             else:
-                logger.error("Fields File not defined %s", u)
+                c = command.strip().split(" ")
+                columns = c[1:]
+                for j in columns:
+                    u = next(it)
+                    n = c[0] + "_" + j
+                    named.append((n, u[1], u[2]))
+    except StopIteration as e:
+        logger.error("Key iteration stopped", e)
+    return named
 
 
 def build_keys(file, keys_name, keys_orig):
@@ -858,31 +893,12 @@ def build_keys(file, keys_name, keys_orig):
     # key_name is the new keys file to be created and overridden
     with open(keys_name, "w+") as out:
         with open(file, 'r') as f:
-            d = load_keys(keys_orig, out_dict=False)
-            it = iter(d)
-            try:
-                for command in f:
-                    if " " not in command:
-                        # logger.error(command)
-                        u = next(it)
-                        # logger.error(u)
-                        u = command.strip(), u[1], u[2]
-                        out.write("\t\t".join(u) + "\n")
-                    else:
-                        c = command.strip().split(" ")
-                        columns = c[1:]
-                        for j in columns:
-                            u = next(it)
-                            n = c[0] + "_" + j
-                            u = n, u[1], u[2]
-                            out.write("\t\t".join(u) + "\n")
-            except StopIteration as e:
-                logger.error("Key iteration stopped", e)
-
-
-def process_fields(file):
-    year_keys_name = os.path.join(key_mapping_folder, year_folder)
-    year_fields_name = os.path.join(fields_mapping_folder, year_folder)
+            out.write(keys_text(named_keys(f, load_keys(keys_orig, out_dict=False))))
+
+
+def process_fields(file, year_folder, folders=default_keys_folders):
+    year_keys_name = os.path.join(folders.key_mapping, year_folder)
+    year_fields_name = os.path.join(folders.fields_mapping, year_folder)
 
     keys_name = os.path.splitext(file)[0] + keys_extension
     keys_orig = os.path.join(year_keys_name, os.path.relpath(keys_name, year_fields_name))
@@ -905,17 +921,17 @@ def process_fields(file):
     fill_pdf_from_keys(file=pdf_orig, out_file=pdf_name, d={k: v[0] for k, v in d.items()})
 
 
-def generate_keys_pdf():
-    year_fields_name = os.path.join(fields_mapping_folder, year_folder)
+def generate_keys_pdf(year_folder, folders=default_keys_folders):
+    year_fields_name = os.path.join(folders.fields_mapping, year_folder)
     for u in glob.glob(os.path.join(year_fields_name, "*", "*")):
         if u.endswith(fields_extension):
             logger.info("Processing fields file %s", u)
-            process_fields(u)
+            process_fields(u, year_folder, folders)
 
 
-def move_keys_to_parent():
-    year_fields_name = os.path.join(fields_mapping_folder, year_folder)
-    forms_year_folder = os.path.join(forms_folder, year_folder)
+def move_keys_to_parent(year_folder, folders=default_keys_folders):
+    year_fields_name = os.path.join(folders.fields_mapping, year_folder)
+    forms_year_folder = os.path.join(folders.forms, year_folder)
     for u in glob.glob(os.path.join(year_fields_name, "*", "*")):
         if u.endswith(keys_extension):
             logger.info("Moving keys file %s", u)
@@ -928,14 +944,14 @@ def move_keys_to_parent():
                 logger.error("Already Exists - Not Moved  %s to %s", u, folder_path)
 
 
-def main():
-    map_folders(fields_mapping_folder, year_folder)
-    create_empty_fields()
-    fill_fields_files()  # run after defining the fields files
-    generate_keys_pdf()
-    move_keys_to_parent()  # moves the keys files when done
+def main(year=None, folders=default_keys_folders):
+    year = year or year_folder
+    map_folders(folders.fields_mapping, year, folders.forms)
+    create_empty_fields(year, folders)
+    fill_fields_files(year, folders)  # run after defining the fields files
+    generate_keys_pdf(year, folders)
+    move_keys_to_parent(year, folders)  # moves the keys files when done
 
 
 if __name__ == "__main__":
-    year_folder = "2024"
-    main()
+    main("2024")
@@ -1,9 +1,15 @@
 import os
+import copy
 import json
+import itertools
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
 
 from utils.form_worksheet_names import k_it201
 from utils.forms_constants import *
-from utils.forms_utils import fill_pdf_from_keys, logging, process_logger, map_folders, load_keys, output_pdf_folder
+from utils.forms_utils import fill_pdf_from_keys, fill_pages_from_keys, logging, process_logger, map_folders, \
+    load_keys_index, output_pdf_folder
 from pdfrw import PdfReader, PdfWriter
 from utils.user_interface import update_dict
 from utils.forms_core_2018 import fill_taxes_2018
@@ -13,37 +19,74 @@ from utils.forms_core_2021 import fill_taxes_2021
 from utils.forms_core_2022 import fill_taxes_2022
 from utils.forms_core_2023 import fill_taxes_2023
 from utils.forms_core_2024 import fill_taxes_2024
+from utils.forms_carryover import CarryoverStore
+from utils.forms_functions import attach_trade_lots
 
 
 logger = logging.getLogger('fill_taxes')
 process_logger(logger, file_name='fill_taxes')
 
 
-def fill_pdfs(forms_state, forms_year_folder):
-    map_folders(output_pdf_folder, forms_year_folder)
-    form_year_folder = os.path.join(forms_folder, forms_year_folder)
-    output_year_folder = os.path.join(output_pdf_folder, forms_year_folder)
-
-    all_out_files = []
+def forms_to_fill(forms_state, forms_year_folder, forms_root=forms_folder):
+    # yields (form, suffix, template file, values keyed by annotation) for every page set to fill
+    form_year_folder = os.path.join(forms_root, forms_year_folder)
     for f, d_contents in forms_state.items():
         if f in [k_it201]:
             continue
-        d_mapping = load_keys(os.path.join(form_year_folder, f + keys_extension))
+        _, field_to_annotations = load_keys_index(form_year_folder, f)
+        template_file = os.path.join(form_year_folder, f + pdf_extension)
 
-        def fill_one_pdf(contents, suffix=""):
-            ddd = {k: contents[val[0]] for k, val in d_mapping.items() if val[0] in contents}
-            outfile = os.path.join(output_year_folder, f + suffix + pdf_extension)
-            all_out_files.append(outfile)
-            fill_pdf_from_keys(file=os.path.join(form_year_folder, f + pdf_extension),
-                               out_file=outfile, d=ddd)
+        def annotation_values(contents):
+            return {k: v for field, v in contents.items() for k in field_to_annotations.get(field, ())}
         if isinstance(d_contents, list):
             for i, one_content in enumerate(d_contents):
-                fill_one_pdf(one_content, "_" + str(i))
+                yield f, "_" + str(i), template_file, annotation_values(one_content)
         elif isinstance(d_contents, dict):
-            fill_one_pdf(d_contents)
+            yield f, "", template_file, annotation_values(d_contents)
+
+
+def fill_pdfs(forms_state, forms_year_folder, output_folder=output_pdf_folder, workers=1, forms_root=forms_folder):
+    # workers > 1 fills the forms concurrently in a process pool (None for one per cpu)
+    # every form is an independent fill, the returned files keep the forms_state order merge_pdfs expects
+    map_folders(output_folder, forms_year_folder, forms_root)
+    output_year_folder = os.path.join(output_folder, forms_year_folder)
+
+    all_out_files = []
+    templates = []
+    annotation_values = []
+    for f, suffix, template_file, ddd in forms_to_fill(forms_state, forms_year_folder, forms_root):
+        all_out_files.append(os.path.join(output_year_folder, f + suffix + pdf_extension))
+        templates.append(template_file)
+        annotation_values.append(ddd)
+    if workers == 1 or len(all_out_files) < 2:
+        for template_file, outfile, ddd in zip(templates, all_out_files, annotation_values):
+            fill_pdf_from_keys(file=template_file, out_file=outfile, d=ddd)
+    else:
+        # each worker keeps its own template cache, consecutive pages of a form share one
+        chunksize = max(1, len(all_out_files) // ((workers or os.cpu_count()) * 2))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(fill_pdf_from_keys, templates, all_out_files, annotation_values, chunksize=chunksize):
+                pass
     return all_out_files
 
 
+def fill_merged_pdf(forms_state, forms_year_folder, out, output_folder=output_pdf_folder, keep_forms=False,
+                    forms_root=forms_folder):
+    # single pass: filled pages go straight into one writer, no per-form file round trip
+    # keep_forms also writes the per-form files, as fill_pdfs does
+    writer = PdfWriter()
+    if keep_forms:
+        map_folders(output_folder, forms_year_folder, forms_root)
+    output_year_folder = os.path.join(output_folder, forms_year_folder)
+    for f, suffix, template_file, ddd in forms_to_fill(forms_state, forms_year_folder, forms_root):
+        writer.addpages(fill_pages_from_keys(file=template_file, d=ddd))
+        if keep_forms:
+            outfile = os.path.join(output_year_folder, f + suffix + pdf_extension)
+            fill_pdf_from_keys(file=template_file, out_file=outfile, d=ddd)
+    writer.write(out)
+    logger.info("Exporting merged PDF file %s succeeded", out)
+
+
 def merge_pdfs(files, out):
     writer = PdfWriter()
     for inpfn in files:
@@ -110,7 +153,172 @@ def gather_inputs(input_year_folder):
         ]
     )
 
-    return data
+    return attach_trade_lots(data)
+
+
+fill_taxes_by_year = {
+    "2023": fill_taxes_2023,
+    "2024": fill_taxes_2024,
+}
+
+
+def household_years(inputs, client="", store=None):
+    # yields (year, (states, worksheets, summary)) for one client, inputs maps year -> gathered data
+    # years are chained in order: year N gets year N-1 (states, worksheets) for the carryover worksheet
+    # with a store (see CarryoverStore), the first year takes its carryover from there, every year is recorded
+    results = {}
+    for year in sorted(inputs):
+        previous_year = str(int(year) - 1)
+        previous = results.get(previous_year)
+        if previous is not None:
+            output_previous = previous[:2]
+        elif store is not None:
+            output_previous = store.get(client, previous_year)
+        else:
+            output_previous = None
+        results[year] = fill_taxes_by_year[year](inputs[year], output_previous)
+        if store is not None:
+            store.put(client, year, results[year][0])
+        yield year, results[year]
+
+
+def compute_household(inputs, client="", store=None):
+    return dict(household_years(inputs, client, store))
+
+
+def compute_household_failures(inputs, client="", store=None):
+    # compute_household that keeps the years computed before an error, returns (results, failures)
+    # failures maps year -> error message, the years after a failed one are not computed (no carryover)
+    results = {}
+    try:
+        for year, result in household_years(inputs, client, store):
+            results[year] = result
+    except Exception as e:
+        failed = [year for year in sorted(inputs) if year not in results]
+        logger.error("Client %s failed in %s -- %s: %s", client, failed[0], type(e).__name__, e)
+        return results, {
+            year: f"{type(e).__name__}: {e}" if i == 0 else f"not computed, {failed[0]} failed"
+            for i, year in enumerate(failed)
+        }
+    return results, {}
+
+
+def save_outputs(year, states, worksheets, summary, folder="", single_pass=False, keep_forms=True, workers=1):
+    # json files, per-form pdf files and merged pdf for one year, written under folder
+    # single_pass builds the merged pdf without re-reading per-form files, keep_forms then controls those
+    # workers fills the per-form files concurrently, see fill_pdfs
+    save_json(data=states, out=os.path.join(folder, "data" + year + json_extension))
+    save_json(data=worksheets, out=os.path.join(folder, "worksheet" + year + json_extension))
+    save_json(data=summary, out=os.path.join(folder, "summary" + year + json_extension))
+    output_folder = os.path.join(folder, output_pdf_folder)
+    outfile = os.path.join(folder, "forms" + year + pdf_extension)
+    if single_pass:
+        fill_merged_pdf(states, year, out=outfile, output_folder=output_folder, keep_forms=keep_forms)
+    else:
+        pdf_files = fill_pdfs(states, year, output_folder=output_folder, workers=workers)
+        merge_pdfs(pdf_files, outfile)
+
+
+def main_parallel(households, workers=None, folder=output_pdf_folder, single_pass=False, keep_forms=True, store=None):
+    # households maps client name -> {year: gathered data}
+    # each client chain of years is computed in one task (carryover dependency),
+    # then every (client, year) output is written in its own task
+    # outputs go to folder/<client>/ with the same layout as main(), see save_outputs for single_pass
+    # store is an optional CarryoverStore, see compute_household
+    # a failing (client, year) does not stop the others, returns {(client, year): error message} for the failures
+    failures = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        computed = {
+            pool.submit(compute_household_failures, inputs, client, store): client
+            for client, inputs in households.items()
+        }
+        written = {}
+        for future in as_completed(computed):
+            client = computed[future]
+            try:
+                results, client_failures = future.result()
+            except Exception as e:  # the task itself, e.g. a worker that died
+                logger.error("Client %s failed -- %s: %s", client, type(e).__name__, e)
+                results, client_failures = {}, {year: f"{type(e).__name__}: {e}" for year in households[client]}
+            failures.update(((client, year), message) for year, message in client_failures.items())
+            client_folder = os.path.join(folder, client)
+            os.makedirs(client_folder, exist_ok=True)
+            for year, (states, worksheets, summary) in results.items():
+                written[pool.submit(
+                    save_outputs, year, states, worksheets, summary, client_folder, single_pass, keep_forms
+                )] = client, year
+                logger.info("Computed %s %s", client, year)
+        for future in as_completed(written):
+            client, year = written[future]
+            try:
+                future.result()
+            except Exception as e:
+                logger.error("Client %s %s outputs failed -- %s: %s", client, year, type(e).__name__, e)
+                failures[client, year] = f"{type(e).__name__}: {e}"
+    if failures:
+        logger.error("%s of %s client years failed: %s", len(failures),
+                     sum(len(inputs) for inputs in households.values()),
+                     ", ".join(f"{client} {year}" for client, year in sorted(failures)))
+    return failures
+
+
+def set_path(d, path, value):
+    # path is a tuple of keys / list indices into the input dict, e.g. ('W2', 0, 'Wages')
+    for k in path[:-1]:
+        d = d[k]
+    d[path[-1]] = value
+
+
+def sweep_point(year, base, paths, lines, output_previous, values):
+    # (summary lines, None) or ({}, error message) when the engine fails on that point
+    d = copy.deepcopy(base)
+    for path, value in zip(paths, values):
+        set_path(d, path, value)
+    if trade_lots_keyword in d and any(path[0] == '1099' for path in paths):
+        attach_trade_lots(d)  # the lots of the point's trades
+    try:
+        _, _, summary = fill_taxes_by_year[year](d, output_previous)
+    except Exception as e:  # ValueError for parts of the forms that are not implemented, or any engine error
+        logger.error("Sweep point %s failed -- %s: %s", values, type(e).__name__, e)
+        return {}, f"{type(e).__name__}: {e}"
+    if lines is None:
+        return summary, None
+    return {line: summary[line] for line in lines if line in summary}, None
+
+
+def sweep(base, grid, lines=None, year="2024", output_previous=None, workers=None):
+    # recomputes the return for every point of the grid, no json / pdf output
+    # base is a gather_inputs dict, grid maps a path (see set_path) to the values it takes
+    # lines are the summary_info labels to keep, all of them if None
+    # returns a DataFrame with one column per path ('W2.0.Wages'), one per line, then 'error'
+    # points the engine fails on have their lines NaN and the error in 'error' (None for the others),
+    # lines absent from a return are NaN
+    paths = list(grid)
+    points = list(itertools.product(*grid.values()))
+    compute = partial(sweep_point, year, base, paths, lines, output_previous)
+    workers = workers or os.cpu_count()
+    chunksize = max(1, len(points) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(compute, points, chunksize=chunksize))
+    columns = [".".join(str(k) for k in path) for path in paths]
+    table = pd.DataFrame(points, columns=columns)
+    summaries = pd.DataFrame([summary for summary, _ in results], columns=lines)
+    errors = pd.DataFrame({'error': [error for _, error in results]})
+    failed = errors['error'].notna().sum()
+    if failed:
+        logger.error("Sweep: %s of %s points failed", failed, len(points))
+    return pd.concat([table, summaries, errors], axis=1)
+
+
+def main_year(year, client="", store=None, folder=""):
+    # one year only: the previous year carryover comes from the store, or from data<year-1>.json in folder,
+    # the previous year engine is not run
+    store = store or CarryoverStore()
+    data = gather_inputs(input_year_folder=year)
+    output_previous = store.get(client, str(int(year) - 1), folder=folder)
+    states, worksheets, summary = fill_taxes_by_year[year](data, output_previous)
+    store.put(client, year, states)
+    save_outputs(year, states, worksheets, summary, folder)
 
 
 def main():
@@ -150,21 +358,14 @@ def main():
     # states2023, worksheets_2023, summary_2023 =
     # fill_taxes_2023(d=data2023, output_2022=(states2022, worksheets_all2022))
     states2023, worksheets_2023, summary_2023 = fill_taxes_2023(d=data2023, output_2022=None)
-    save_json(data=states2023, out="data" + "2023" + json_extension)
-    save_json(data=worksheets_2023, out="worksheet" + "2023" + json_extension)
-    save_json(data=summary_2023, out="summary" + "2023" + json_extension)
-    pdf_files2023 = fill_pdfs(states2023, "2023")
-    outfile2023 = "forms" + "2023" + pdf_extension
-    merge_pdfs(pdf_files2023, outfile2023)
-
-    data2024 = gather_inputs(input_year_folder="2024")
-    states2024, worksheets_2024, summary_2024 = fill_taxes_2024(d=data2024, output_2023=(states2023, worksheets_2023))
-    save_json(data=states2024, out="data" + "2024" + json_extension)
-    save_json(data=worksheets_2024, out="worksheet" + "2024" + json_extension)
-    save_json(data=summary_2024, out="summary" + "2024" + json_extension)
-    pdf_files2024 = fill_pdfs(states2024, "2024")
-    outfile2024 = "forms" + "2024" + pdf_extension
-    merge_pdfs(pdf_files2024, outfile2024)
+    save_outputs("2023", states2023, worksheets_2023, summary_2023)
+    store = CarryoverStore()
+    store.put("", "2023", states2023)
+
+    # data2024 = gather_inputs(input_year_folder="2024")
+    # states2024, worksheets_2024, summary_2024 = fill_taxes_2024(d=data2024, output_2023=(states2023, worksheets_2023))
+    # save_outputs("2024", states2024, worksheets_2024, summary_2024)
+    main_year("2024", store=store)
 
 
 if __name__ == "__main__":
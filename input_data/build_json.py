@@ -7,21 +7,24 @@ import logging
 import json
 from utils.logger import process_logger
 from input_data.parse_data import read_data
+from input_data.parse_cache import ParseCache
 
 logger = logging.getLogger('input_data')
 process_logger(logger, file_name="json_data")
 
 
-def build_json(folder):
-    data = read_data(folder=folder)
+def build_json(folder, workers=1, use_cache=True):
+    # workers > 1 parses the input files in parallel, see read_data
+    # use_cache only parses the files that are new or changed since a previous run, see ParseCache
+    data = read_data(folder=folder, workers=workers, cache=ParseCache() if use_cache else None)
     with open(os.path.join(folder, 'input.json'), 'w+') as f:
         json.dump(data, f, indent=4)
         logger.debug("json dumped %s", f.name)
 
 
-def build_input(year_folder):
+def build_input(year_folder, workers=1, use_cache=True):
     input_full_folder = os.path.join(os.getcwd(), "input_data", year_folder)
-    build_json(input_full_folder)
+    build_json(input_full_folder, workers=workers, use_cache=use_cache)
 
 
 def main():
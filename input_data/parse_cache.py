@@ -0,0 +1,75 @@
+import os
+import pickle
+import hashlib
+import logging
+
+
+logger = logging.getLogger('input_data')
+
+parser_version = 1  # bump when a parser output changes, older entries are then never read again
+parse_cache_folder = os.path.join("input_data", "parse_cache")
+parse_cache_max_bytes = 512 * 2 ** 20
+parse_cache_extension = ".pickle"
+
+
+class ParseCache:
+    # parsed input files on disk, one pickle per (file content hash, file name, parser version)
+    # the file name is part of the key because the parsers branch on it (broker, year)
+    # entries are touched when read, the least recently used go once the folder is over max_bytes
+    def __init__(self, folder=parse_cache_folder, max_bytes=parse_cache_max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(f):
+        h = hashlib.sha256()
+        with open(f, 'rb') as file:
+            for chunk in iter(lambda: file.read(2 ** 20), b''):
+                h.update(chunk)
+        h.update(os.path.basename(f).encode())
+        h.update(str(parser_version).encode())
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.folder, key + parse_cache_extension)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.debug("Unusable parse cache entry %s -- %s", path, e)
+            return None
+        return value
+
+    def put(self, key, value):
+        os.makedirs(self.folder, exist_ok=True)
+        path = self.path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"  # several processes may write at once
+        with open(tmp, 'wb') as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith(parse_cache_extension):
+                try:
+                    stat = os.stat(os.path.join(self.folder, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+            logger.debug("Evicted parse cache entry %s", name)
@@ -2,8 +2,13 @@
 # parsing is sensitive to the version of the package
 # maintaining this is nonsense
 import os
+import csv
 import glob
+import time
 from collections import defaultdict
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import numpy as np
 import pandas as pd
 import xml.etree.ElementTree as eTree
@@ -11,45 +16,84 @@ from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
 from pdfminer.converter import TextConverter
 from pdfminer.layout import LAParams
 from pdfminer.pdfpage import PDFPage
-from io import StringIO
+from io import StringIO, BytesIO
 import logging
 
 
 logger = logging.getLogger('input_data')
 
 
-def parse_pdf(path, print_lines=False):
-    rsrcmgr = PDFResourceManager()
-    retstr = StringIO()
-    codec = 'utf-8'
-    laparams = LAParams()
-    device = TextConverter(rsrcmgr, retstr, codec=codec, laparams=laparams)
-    with open(path, 'rb') as fp:
-        interpreter = PDFPageInterpreter(rsrcmgr, device)
+class PdfLines:
+    # text lines of a pdf, the same list parse_pdf always returned, except pages are laid out one at a time
+    # and only as far as the highest line asked for, the pages after it are never analysed
+    def __init__(self, path):
+        with open(path, 'rb') as fp:
+            self.fp = BytesIO(fp.read())
+        rsrcmgr = PDFResourceManager()
+        self.retstr = StringIO()
+        codec = 'utf-8'
+        laparams = LAParams()
+        self.device = TextConverter(rsrcmgr, self.retstr, codec=codec, laparams=laparams)
+        self.interpreter = PDFPageInterpreter(rsrcmgr, self.device)
         password = ""
         maxpages = 0
         caching = True
         pagenos = set()
+        self.pages = PDFPage.get_pages(self.fp, pagenos, maxpages=maxpages, password=password,
+                                       caching=caching, check_extractable=True)
+        self.lines = []
+        self.pending = ""  # last line so far, may go on in the next page
+        self.done = False
+
+    def next_page(self):
+        page = next(self.pages, None)
+        if page is None:
+            self.lines.append(self.pending)
+            self.done = True
+            self.device.close()
+            self.retstr.close()
+            self.fp.close()
+            return
+        self.interpreter.process_page(page)
+        parts = (self.pending + self.retstr.getvalue()).split("\n")
+        self.retstr.seek(0)
+        self.retstr.truncate()
+        self.pending = parts.pop()
+        self.lines.extend(parts)
+
+    def extract(self, stop=None):
+        # lines before stop are there after this, all of them if stop is None
+        while not self.done and (stop is None or len(self.lines) < stop):
+            self.next_page()
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            forward = (i.start or 0) >= 0 and (i.step or 1) > 0 and i.stop is not None and i.stop >= 0
+            self.extract(i.stop if forward else None)
+        else:
+            self.extract(i + 1 if i >= 0 else None)
+        return self.lines[i]
+
+    def __len__(self):
+        self.extract()
+        return len(self.lines)
 
-        for page in PDFPage.get_pages(fp, pagenos, maxpages=maxpages, password=password, caching=caching,
-                                      check_extractable=True):
-            interpreter.process_page(page)
-        text = retstr.getvalue()
+    def __iter__(self):
+        i = 0
+        while True:
+            self.extract(i + 1)
+            if i >= len(self.lines):
+                return
+            yield self.lines[i]
+            i += 1
 
-    device.close()
-    retstr.close()
 
-    u = text.split("\n")
+def parse_pdf(path, print_lines=False):
+    u = PdfLines(path)
     if print_lines:  # print line numbers
         print(f"File to be printed {path}")
-        it = iter(u)
-        i = 0
-        try:
-            while True:
-                print(i, next(it))
-                i += 1
-        except StopIteration:
-            pass
+        for i, line in enumerate(u):
+            print(i, line)
 
     return u
 
@@ -674,19 +718,96 @@ def parse_1099_pdf(path):
     return d
 
 
-def parse_1099_csv(path):
-    table = pd.read_csv(path, header=None)
+csv_summary_label = "1099 Summary          "
+csv_trades_label = "1099-B-Detail                           "
+# cells pandas.read_csv reads as missing, a column missing in one row of a section is dropped for the whole section
+csv_na_values = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+csv_trades_mapping = {
+    "1099-B-1a Description of property Stock or Other symbol CUSIP ": "SalesDescription",
+    "Quantity": "Shares",
+    "1099-B-1b Date Acquired": "DateAcquired",
+    "1099-B-1c Date Sold or Disposed": "DateSold",
+    "1099-B-1d Proceeds": "Proceeds",
+    "1099-B-1e Cost or Other Basis": "Cost",
+    "1099-B-1f Accrued Market Discount": "WashSaleCode",
+    "1099-B-1g-Wash sale loss Disallowed": "WashSaleValue",
+    "Term": "LongShort",
+}
+
+
+def try_float_csv(x):
+    try:
+        return float(x)
+    except ValueError:
+        return x.strip()
+
+
+def read_csv_rows(path):
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if row:  # blank lines are skipped, as read_csv does
+                yield row
+
+
+def csv_sections(path, labels):
+    # first pass over the file, nothing but a set of columns per section is kept
+    # a section is the rows starting with one of labels, its first row is the header
+    # returns label -> (header row, columns with a value in every row of the section)
+    width = None
+    headers, missing = {}, {}
+    for row in read_csv_rows(path):
+        if width is None:
+            width = len(row)  # read_csv takes the width of the first line, shorter rows are padded with missing
+        label = row[0]
+        if label not in labels:
+            continue
+        if label not in headers:
+            headers[label] = row
+            missing[label] = set()
+        missing[label].update(j for j in range(1, width) if j >= len(row) or row[j] in csv_na_values)
+    return {
+        label: (header, [j for j in range(1, width) if j not in missing[label]])
+        for label, header in headers.items()
+    }
 
-    # interest
-    t_interest = table.loc[table[0] == "1099 Summary          "]. \
-        drop([0], axis=1).dropna(axis=1).T.set_index(0).T
-    d_interest = t_interest.to_dict('records')[0]
 
-    def try_float(x):
-        try:
-            return float(x)
-        except ValueError:
-            return x.strip()
+def csv_section_rows(path, label):
+    # rows of a section after its header
+    rows = (row for row in read_csv_rows(path) if row[0] == label)
+    next(rows, None)
+    return rows
+
+
+def iter_1099_csv_trades(path, sections=None):
+    # normalized trades, one csv row at a time: memory does not grow with the file
+    # sections is csv_sections(path, ...) when already computed
+    if sections is None:
+        sections = csv_sections(path, {csv_trades_label})
+    if csv_trades_label not in sections:
+        return
+    header, columns = sections[csv_trades_label]
+    keys = [(j, csv_trades_mapping.get(header[j], header[j])) for j in columns]
+    for row in csv_section_rows(path, csv_trades_label):
+        trade_d = {k: try_float_csv(row[j]) for j, k in keys}
+        form_code = trade_d['Covered/Uncovered']
+        long_short = trade_d['LongShort']
+        trade_d["FormCode"] = ("A" if form_code == "COVERED" else "B") if long_short == "SHORT TERM" \
+            else ("D" if form_code == "COVERED" else "E")
+        yield trade_d
+
+
+def parse_1099_csv(path, stream_trades=False):
+    # the file is read row by row (two passes), never loaded as a whole
+    # stream_trades leaves "Trades" as the iter_1099_csv_trades generator instead of a list
+    sections = csv_sections(path, {csv_summary_label, csv_trades_label})
+
+    # interest
+    header, columns = sections[csv_summary_label]
+    values = next(csv_section_rows(path, csv_summary_label))
+    d_interest = {header[j]: values[j] for j in columns}
 
     interest_mapping = {
         "1099-DIV-1A Total Ordinary Dividends": "Ordinary Dividends",
@@ -701,7 +822,7 @@ def parse_1099_csv(path):
         "1099-B-Federal Income Tax Withheld": "Federal Income Tax Withheld",
     }
 
-    d_interest = dict((interest_mapping.get(k, k), try_float(v)) for k, v in d_interest.items())
+    d_interest = dict((interest_mapping.get(k, k), try_float_csv(v)) for k, v in d_interest.items())
 
     if "Fidelity" in path:
         d_interest['Institution'] = """NATIONAL FINANCIAL SERVICES LLC"""
@@ -709,98 +830,121 @@ def parse_1099_csv(path):
     # JERSEY CITY, NJ 07310"""
 
     # trades
-    t_trades = table.loc[table[0] == "1099-B-Detail                           "]. \
-        drop([0], axis=1).dropna(axis=1).T.set_index(1).T
-    d_trades = t_trades.to_dict('records')
-
-    trades_mapping = {
-        "1099-B-1a Description of property Stock or Other symbol CUSIP ": "SalesDescription",
-        "Quantity": "Shares",
-        "1099-B-1b Date Acquired": "DateAcquired",
-        "1099-B-1c Date Sold or Disposed": "DateSold",
-        "1099-B-1d Proceeds": "Proceeds",
-        "1099-B-1e Cost or Other Basis": "Cost",
-        "1099-B-1f Accrued Market Discount": "WashSaleCode",
-        "1099-B-1g-Wash sale loss Disallowed": "WashSaleValue",
-        "Term": "LongShort",
-    }
-
-    d_trades_clean = []
-    for t in d_trades:
-        trade_d = dict((trades_mapping.get(k, k), try_float(v)) for k, v in t.items())
-        form_code = trade_d['Covered/Uncovered']
-        long_short = trade_d['LongShort']
-        trade_d["FormCode"] = ("A" if form_code == "COVERED" else "B") if long_short == "SHORT TERM" \
-            else ("D" if form_code == "COVERED" else "E")
-        d_trades_clean.append(trade_d)
-
-    d_interest["Trades"] = d_trades_clean
+    trades = iter_1099_csv_trades(path, sections)
+    d_interest["Trades"] = trades if stream_trades else list(trades)
 
     logger.info("Parsed 1099 %s", path)
 
     return d_interest
 
 
-def parse_1099_xml(path):
+xml_tag_map = {
+    "INFO": {"FINAME_DIRECTDEPOSIT": "Institution"},
+    "DIV": {"ORDDIV": "Ordinary Dividends",
+            "QUALIFIEDDIV": "Qualified Dividends",
+            "FORTAXPD": "Foreign Tax"},
+    "INT": {"INTINCOME": "Interest"},
+    "B_V100": {"EXTDBINFO_V100": "Trades"},
+}
+xml_trade_info_map = {
+    "SalesDescription": "SALEDESCRIPTION",
+    "DateAcquired": "DTAQD",
+    "DateSold": "DTSALE",
+    "Proceeds": "SALESPR",
+    "Cost": "COSTBASIS",
+    "Shares": "NUMSHRS",
+    "Name": "SECNAME",
+    "LongShort": "LONGSHORT",
+    "FormCode": "FORM8949CODE",
+}
+
+
+def parse_xml_trade(ttt):
+    ddd = {k: ttt.find(desc).text for k, desc in xml_trade_info_map.items()}
+    wash = ttt.find("WASHSALELOSSDISALLOWED")
+    if wash is not None:
+        ddd.update({
+            "WashSaleValue": float(wash.text),
+            "WashSaleCode": "W"
+        })
+    for f in ["Proceeds", "Cost", "Shares"]:
+        ddd[f] = float(ddd[f])
+    for f in ["DateAcquired", "DateSold"]:
+        date = ddd[f]
+        ddd[f] = date[4:6] + "," + date[6:8] + "," + date[:4]
+    return ddd
+
+
+def iter_1099_xml(path):
+    # streaming read of the first TAX1099RS (see parse_xml), the document is never held whole:
+    # elements are read when they close then dropped
+    # yields (clean name, value) for the lines of xml_tag_map, the lines of one form in xml_tag_map order
+    # a line with sub-elements is a trades list, yielded as soon as it opens as a generator over its trades,
+    # each trade parsed when its element closes -- the generator is drained before the next item if not consumed
+    events = eTree.iterparse(path, events=('start', 'end'))
+    stack = []  # open elements: root, node, node1, tax root, form, line, trade
+    tax_root = None
+    names, values = None, {}
+
+    def read_trades(container):
+        count, gain = 0, 0.
+        for event, elem in events:
+            if event == 'start':
+                stack.append(elem)
+                continue
+            stack.pop()
+            if elem is container:
+                break
+            if len(stack) == 6:  # a trade closed
+                trade = parse_xml_trade(elem)
+                count += 1
+                gain += trade["Proceeds"] - trade["Cost"] + trade.get("WashSaleValue", 0.)
+                yield trade
+                container.remove(elem)  # only child left
+        logger.info("Number of trades %i", count)
+        logger.info("Total capital gain %.2f", gain)
+
+    for event, elem in events:
+        if event == 'start':
+            stack.append(elem)
+            if tax_root is None:
+                if len(stack) == 4 and elem.tag == "TAX1099RS":
+                    tax_root = elem
+            elif len(stack) == 5:
+                names = {}
+                for t, v in xml_tag_map.items():
+                    if t in elem.tag:
+                        names.update(v)
+                values = {}
+            elif len(stack) == 7 and stack[5].tag in names:
+                trades = read_trades(container=stack[5])
+                yield names[stack[5].tag], trades
+                for _ in trades:
+                    pass
+            continue
 
-    def parse_dict(dd, name_map):
-        def parse_element(name):
-            uu = dd.find(name)
-            if uu.text.strip() != "":
-                if "INFO" in dd.tag:
-                    return uu.text
-                return float(uu.text)
-            trades = []
-
-            trade_info_map = {
-                "SalesDescription": "SALEDESCRIPTION",
-                "DateAcquired": "DTAQD",
-                "DateSold": "DTSALE",
-                "Proceeds": "SALESPR",
-                "Cost": "COSTBASIS",
-                "Shares": "NUMSHRS",
-                "Name": "SECNAME",
-                "LongShort": "LONGSHORT",
-                "FormCode": "FORM8949CODE",
-            }
-            for ttt in uu:
-                ddd = {k: ttt.find(desc).text for k, desc in trade_info_map.items()}
-                wash = ttt.find("WASHSALELOSSDISALLOWED")
-                if wash is not None:
-                    ddd.update({
-                        "WashSaleValue": float(wash.text),
-                        "WashSaleCode": "W"
-                    })
-                for f in ["Proceeds", "Cost", "Shares"]:
-                    ddd[f] = float(ddd[f])
-                for f in ["DateAcquired", "DateSold"]:
-                    date = ddd[f]
-                    ddd[f] = date[4:6] + "," + date[6:8] + "," + date[:4]
-                trades.append(ddd)
-            logger.info("Number of trades %i", len(trades))
-            logger.info("Total capital gain %.2f", sum(i["Proceeds"] - i["Cost"] + i.get("WashSaleValue", 0.)
-                                                       for i in trades))
-            return trades
-
-        return {clean_name: parse_element(name)
-                for name, clean_name in name_map.items()}
-
-    tag_map = {
-        "INFO": {"FINAME_DIRECTDEPOSIT": "Institution"},
-        "DIV": {"ORDDIV": "Ordinary Dividends",
-                "QUALIFIEDDIV": "Qualified Dividends",
-                "FORTAXPD": "Foreign Tax"},
-        "INT": {"INTINCOME": "Interest"},
-        "B_V100": {"EXTDBINFO_V100": "Trades"},
-    }
+        stack.pop()
+        if tax_root is None or len(stack) < 4:
+            elem.clear()
+            if elem is tax_root:
+                return
+        elif len(stack) == 5 and elem.tag in names:
+            text = elem.text or ""
+            if text.strip() != "":
+                values[names[elem.tag]] = text if "INFO" in stack[4].tag else float(text)
+            else:
+                values[names[elem.tag]] = []
+        elif len(stack) == 4:
+            for name in names.values():
+                if name in values:
+                    yield name, values[name]
+            tax_root.remove(elem)
 
-    tax_root = parse_xml(path=path, print_tag=False)
 
+def parse_1099_xml(path):
     d = {}
-    for u in tax_root:
-        for t, v in tag_map.items():
-            if t in u.tag:
-                d.update(parse_dict(u, v))
+    for name, value in iter_1099_xml(path):
+        d[name] = list(value) if isinstance(value, Iterator) else value
 
     logger.info("Parsed 1099 %s", path)
     return d
@@ -865,26 +1009,55 @@ def parse_transaction(path, year):
     return d
 
 
-def read_data(folder):
+def parse_input_file(f, cache=None):
+    # (data key, parsed content, seconds spent) for one input file, None when it is not one
+    # cache is a ParseCache, an unchanged file is then not parsed again
+    name = os.path.basename(f)
+    name_sub, extension = name.split(".")
+    if extension == 'json':
+        return None
+    company, form, year = name_sub.split("-")
+    start = time.perf_counter()
+    if cache is not None:
+        cache_key = cache.key(f)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Parse cache hit %s", name)
+            return (*cached, time.perf_counter() - start)
+    if form == "W2":
+        key, content = 'W2', parse_w2(f)
+    elif form == '1099':
+        key, content = '1099', parse_1099(f)  # there may be several 1099
+    elif form == "transaction_history":
+        key, content = 'transaction', parse_transaction(f, int(year))
+    else:
+        logger.error(f"Input not parsed read_data\t{name}")
+        return None
+    if cache is not None:
+        cache.put(cache_key, (key, content))
+    return key, content, time.perf_counter() - start
+
+
+def read_data(folder, workers=1, timings=None, cache=None):
+    # workers > 1 parses the files in a process pool (None for one per cpu), the data is the same as serial
+    # timings, if given, is filled with the parse time of every file name
+    # cache is an optional ParseCache, see parse_input_file
     data = defaultdict(list)
 
-    for f in glob.glob(os.path.join(folder, "*")):
-        if os.path.isdir(f):
-            continue
-        name = os.path.basename(f)
-        name_sub, extension = name.split(".")
-        if extension == 'json':
+    files = [f for f in glob.glob(os.path.join(folder, "*")) if not os.path.isdir(f)]
+    parse = partial(parse_input_file, cache=cache)
+    if workers == 1 or len(files) < 2:
+        parsed = list(map(parse, files))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(parse, files))  # in files order
+
+    for f, one in zip(files, parsed):
+        if one is None:
             continue
-        company, form, year = name_sub.split("-")
-        if form == "W2":
-            w2_data = parse_w2(f)
-            data['W2'].append(w2_data)
-        elif form == '1099':
-            data_1099 = parse_1099(f)  # there may be several 1099
-            data['1099'].append(data_1099)
-        elif form == "transaction_history":
-            data_transaction = parse_transaction(f, int(year))
-            data['transaction'].append(data_transaction)
-        else:
-            logger.error(f"Input not parsed read_data\t{name}")
+        key, content, elapsed = one
+        data[key].append(content)
+        logger.info("Read %s in %.3fs", os.path.basename(f), elapsed)
+        if timings is not None:
+            timings[os.path.basename(f)] = elapsed
     return data
@@ -8,60 +8,50 @@
 from utils.forms_utils import *
 
 
-year_folder = "2024"
+year_folder = "2024"  # when run as a script, the functions take the year and folders as arguments
 
 
-def process_pdf(file):
-    year_name = os.path.join(key_mapping_folder, year_folder)
-    forms_year_folder = os.path.join(forms_folder, year_folder)
+def process_pdf(file, year_folder, folders=default_keys_folders):
+    year_name = os.path.join(folders.key_mapping, year_folder)
+    forms_year_folder = os.path.join(folders.forms, year_folder)
     k_file = os.path.splitext(file)[0] + keys_extension
     if not os.path.isfile(k_file):
-        d = {}
-        d_type = {}  # /Tx for text /Btn for button
-        i = 0
-        template_pdf = pdfrw.PdfReader(file)
-        for annotations in template_pdf.pages:
-            if ANNOT_KEY in annotations:
-                for annotation in annotations[ANNOT_KEY]:
-                    if annotation[SUBTYPE_KEY] == WIDGET_SUBTYPE_KEY:
-                        if annotation[ANNOT_FIELD_KEY]:
-                            key = annotation[ANNOT_FIELD_KEY][1:-1]
-                            fields_type = annotation[ANNOT_FIELD_TYPE_KEY]
-                            d[key] = str(i)
-                            d_type[key] = fields_type
-                            i += 1
-
+        keys = template_keys(file)
+        d = {k: i for i, k, _ in keys}
         k_file_map = os.path.join(year_name, os.path.relpath(k_file, forms_year_folder))
         with open(k_file_map, 'w+') as f:
             logger.info("File created %s", k_file_map)
-            for k, i in d.items():
-                f.write(str(i) + "\t\t" + k + "\t\t" + d_type[k] + "\n")
+            f.write(keys_text(keys))
     else:
         d = load_keys(k_file)
     out_file = os.path.join(year_name, os.path.relpath(file, forms_year_folder))
     fill_pdf_from_keys(file=file, out_file=out_file, d=d)
 
 
-def process_all():
-    forms_year_folder = os.path.join(forms_folder, year_folder)
+def is_template(file):
+    # blank forms that get a .keys file
+    return (
+            os.path.splitext(file)[1] == pdf_extension and os.path.basename(file).startswith("f")
+            or os.path.basename(file) in ['it196_fill_in.pdf']
+    )
+
+
+def process_all(year_folder, folders=default_keys_folders):
+    forms_year_folder = os.path.join(folders.forms, year_folder)
     for u in glob.glob(os.path.join(forms_year_folder, "*", "", "*")):
-        if (
-                os.path.splitext(u)[1] == pdf_extension and os.path.basename(u).startswith("f")
-                or os.path.basename(u) in ['it196_fill_in.pdf']
-        ):
+        if is_template(u):
             logger.info("Processing file %s", u)
-            process_pdf(u)
+            process_pdf(u, year_folder, folders)
         else:
             logger.info("File ignored %s", u)
     # for u in glob.glob(os.path.join(key_mapping_folder, "*", "")):
     #     logger.info("File exists %s", u)
 
 
-def main():
-    # global year_folder
-    # year_folder = "2018"
-    map_folders(key_mapping_folder, year_folder)
-    process_all()
+def main(year=None, folders=default_keys_folders):
+    year = year or year_folder
+    map_folders(folders.key_mapping, year, folders.forms)
+    process_all(year, folders)
 
 
 if __name__ == "__main__":
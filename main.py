@@ -24,21 +24,18 @@
 ====================================================================================================================
 """
 
-import key_matcher
-import fill_keys
+import build_keys
 import fill_taxes
 import input_data.build_json
 import utils.forms_clean
 
 
 def main():
-    for form_filing_year in [
+    # only the forms that changed get their keys built again, all years at once over a process pool
+    build_keys.build_years([
         "2023", "2024",
-    ]:
-        key_matcher.year_folder = form_filing_year
-        key_matcher.main()
-        fill_keys.year_folder = form_filing_year
-        fill_keys.main()
+    ], workers=None)
+    build_keys.KeysCache().prune()
 
     for input_filing_year in []:
         input_data.build_json.build_input(year_folder=input_filing_year)
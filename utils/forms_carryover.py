@@ -0,0 +1,95 @@
+import os
+import json
+import time
+
+from utils.form_worksheet_names import k_1040, k_1040sd
+from utils.forms_constants import logger, carryover_folder, json_extension
+
+
+# prior year lines read by the capital loss carryover worksheet
+carryover_lines = {
+    k_1040: ['15'],
+    k_1040sd: ['7', '15', '21'],
+}
+
+
+def carryover_states(states):
+    # keeps only the carryover lines of a forms_state, forms / lines that are not there stay absent
+    return {
+        f: {line: states[f][line] for line in lines if line in states[f]}
+        for f, lines in carryover_lines.items() if f in states
+    }
+
+
+class CarryoverStore:
+    # carryover lines per (client, year), one json file per pair under folder/<client>/<year>.json
+    # lookups are memoized, a year N return gets its output_N-1 from here instead of running the N-1 engine
+    # an entry records where its lines come from: source is the mtime / size of the data<year>.json they were read
+    # from, None for lines put from a computed return, time is when the entry was written
+    # get with a folder reads data<year>.json again when it changed since (source) or was written after (time) the entry
+    def __init__(self, folder=carryover_folder):
+        self.folder = folder
+        self.memo = {}
+
+    def path(self, client, year):
+        return os.path.join(self.folder, client, year + json_extension)
+
+    def put(self, client, year, states, source=None):
+        entry = dict(lines=carryover_states(states), source=source, time=time.time_ns())
+        file = self.path(client, year)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        with open(file + ".tmp", 'w') as f:
+            json.dump(entry, f, indent=4)
+        os.replace(file + ".tmp", file)
+        self.memo[client, year] = entry
+        return entry['lines']
+
+    @staticmethod
+    def outputs_file(year, folder=""):
+        return os.path.join(folder, "data" + year + json_extension)
+
+    def load_outputs(self, client, year, folder=""):
+        # existing data<year>.json written by fill_taxes.save_outputs
+        file = self.outputs_file(year, folder)
+        if not os.path.isfile(file):
+            return None
+        stat = os.stat(file)
+        with open(file) as f:
+            states = json.load(f)
+        logger.info("Carryover %s %s loaded from %s", client, year, file)
+        return self.put(client, year, states, source=dict(mtime=stat.st_mtime_ns, size=stat.st_size))
+
+    def load_entry(self, client, year):
+        file = self.path(client, year)
+        if not os.path.isfile(file):
+            return None
+        with open(file) as f:
+            entry = json.load(f)
+        if 'lines' not in entry:  # lines only, written before entries had a source
+            entry = dict(lines=entry, source=None, time=os.stat(file).st_mtime_ns)
+        return entry
+
+    def outdated(self, entry, year, folder):
+        file = self.outputs_file(year, folder)
+        if not os.path.isfile(file):
+            return False
+        stat = os.stat(file)
+        if entry['source'] is not None:
+            return entry['source'] != dict(mtime=stat.st_mtime_ns, size=stat.st_size)
+        return stat.st_mtime_ns > entry['time']
+
+    def get(self, client, year, folder=None):
+        # (states, worksheets) as the fill_taxes_<year+1> output argument, None if nothing is stored
+        # folder is where data<year>.json is: read when the store has nothing yet or an older entry,
+        # without a folder the entries are only the ones put
+        if (client, year) not in self.memo:
+            entry = self.load_entry(client, year)
+            if entry is not None:
+                self.memo[client, year] = entry
+        entry = self.memo.get((client, year))
+        if folder is not None and (entry is None or self.outdated(entry, year, folder)):
+            self.load_outputs(client, year, folder)
+            entry = self.memo.get((client, year))
+        if entry is None:
+            return None
+        return {f: dict(f_lines) for f, f_lines in entry['lines'].items()}, {}
@@ -15,7 +15,8 @@ def remove_by_extension(extension):
 
 
 def remove_folder(folder):
-    shutil.rmtree(folder)
+    if os.path.isdir(folder):  # not there when build_keys had nothing to rebuild
+        shutil.rmtree(folder)
 
 
 def clean(filing_year):
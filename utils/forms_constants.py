@@ -1,6 +1,7 @@
 from utils.logger import process_logger, logging
 
 override_keyword = "override"
+trade_lots_keyword = "trade_lots"  # input key of the 8949 lots, see utils.forms_functions.attach_trade_lots
 
 logger = logging.getLogger('key_matching')
 process_logger(logger, file_name='key_matching')
@@ -9,6 +10,8 @@ key_mapping_folder = 'key_mapping'
 fields_mapping_folder = 'fields_mapping'
 output_pdf_folder = "output"
 forms_folder = "forms"
+carryover_folder = "carryover"  # prior year lines, see utils.forms_carryover
+keys_cache_folder = "keys_cache"  # generated .keys kept across utils.forms_clean, see build_keys
 
 keys_extension = ".keys"
 pdf_extension = ".pdf"
@@ -16,6 +19,10 @@ fields_extension = ".fields"
 log_extension = ".log"
 json_extension = ".json"
 
+keys_index_file = "keys_index.pickle"  # compiled .keys per forms/<year> folder
+keys_index_version = 1  # bump when the compiled layout changes
+template_cache_size = 64  # parsed blank pdf templates kept in memory
+
 ANNOT_KEY = '/Annots'
 ANNOT_FIELD_KEY = '/T'
 ANNOT_FIELD_TYPE_KEY = '/FT'
@@ -1,12 +1,14 @@
-from itertools import islice
 from utils.forms_functions import (
     get_main_info,
+    trade_lots,
+    paginate_trades,
+    TradeColumns,
     computation_2023 as computation,
     computation_2023_ny as computation_ny,
     computation_2023_nyc as computation_nyc,
 )
 from utils.form_worksheet_names import *
-from utils.forms_constants import logger
+from utils.forms_constants import logger, trade_lots_keyword
 
 
 def fill_taxes_2023(d, output_2022=None):
@@ -604,37 +606,27 @@ def fill_taxes_2023(d, output_2022=None):
             Form.__init__(self, k_8949)
 
         def build(self):
-            def yield_trades(long_short, form_code):
-                for uu in d['1099']:  # remove crypto transactions
-                    if 'Trades' in uu:
-                        for tt in uu['Trades']:
-                            if long_short in tt['LongShort'] and form_code == tt['FormCode']:
-                                yield tt
-                if contract1256:
-                    if (long_short == "SHORT") and (form_code == "B") and ('8' in forms_state[k_6781]):
-                        yield dict(a="Form 6781, Part I", h=forms_state[k_6781]["8"])
-                    if (long_short == "LONG") and (form_code == "E") and ('9' in forms_state[k_6781]):
-                        yield dict(a="Form 6781, Part I", h=forms_state[k_6781]["9"])
-
             # need a-b-c granularity here
             # a means "Covered/Uncovered" == 'COVERED' --  "FormCode" == "A"
             # b means "Covered/Uncovered" == 'UNCOVERED' --  "FormCode" == "B"
+            lots = d.get(trade_lots_keyword)
+            if lots is None:  # input not from gather_inputs, see attach_trade_lots
+                lots = trade_lots(d['1099'])
+            lots = dict(lots)  # the input lots are left as they are
+            if contract1256:
+                if '8' in forms_state[k_6781]:
+                    lots[('SHORT', 'B')] += TradeColumns([dict(a="Form 6781, Part I", h=forms_state[k_6781]["8"])])
+                if '9' in forms_state[k_6781]:
+                    lots[('LONG', 'E')] += TradeColumns([dict(a="Form 6781, Part I", h=forms_state[k_6781]["9"])])
 
-            trades_subsets = []
             trades_per_page_limit = 14
-            for code in ["A", "B", "C", "D", "E", "F"]:
-                trades_short = yield_trades(long_short='SHORT', form_code=code)
-                trades_long = yield_trades(long_short='LONG', form_code=code)
-                while True:
-                    trades = {
-                        'SHORT': list(islice(trades_short, trades_per_page_limit)),
-                        'LONG': list(islice(trades_long, trades_per_page_limit))
-                    }
-                    if len(trades['SHORT']) == 0 and len(trades['LONG']) == 0:
-                        break
-                    trades_subsets.append((code, trades))
+            trades_subsets = paginate_trades(lots, trades_per_page_limit)
 
             # accumulate the proceeds/cost/adjustment/gain for 1040sd
+            for (ls_key, code), code_lots in lots.items():
+                if len(code_lots) > 0:
+                    for k, v in code_lots.totals().items():
+                        sum_trades[ls_key][code][k] += v
 
             if len(trades_subsets) == 1:
                 # if few enough trades
@@ -651,50 +643,30 @@ def fill_taxes_2023(d, output_2022=None):
             self.push_name_ssn(prefix="II_")
 
             def fill_trades(ls_key, check_key, index):
-                if len(trades[ls_key]) > 0:
+                code_lots = trades[ls_key]
+                if len(code_lots) > 0:
                     self.d[check_key] = True
-                    s_proceeds, s_cost, s_adj, s_gain = 0, 0, 0, 0
-                    for i, t in enumerate(trades[ls_key], 1):
-                        if "a" in t:  # form 6781 stuff
-                            self.d['{}_1_{}_description'.format(index, str(i))] = t["a"]
-                            proceeds, cost, adj = 0, 0, 0
-                            gain = t["h"]
-                            self.push_to_dict('{}_1_{}_gain'.format(index, str(i)), gain)
+                    for i, lot in enumerate(code_lots.lots(), 1):
+                        self.d['{}_1_{}_description'.format(index, str(i))] = lot.description
+                        if lot.gain_only:  # form 6781 stuff
+                            self.push_to_dict('{}_1_{}_gain'.format(index, str(i)), lot.gain)
                         else:
-                            self.d['{}_1_{}_description'.format(index, str(i))] = \
-                                f"{t['Shares']} {t['SalesDescription']}"
-                            self.d['{}_1_{}_date_acq'.format(index, str(i))] = t['DateAcquired']
-                            self.d['{}_1_{}_date_sold'.format(index, str(i))] = t['DateSold']
-
-                            proceeds = t['Proceeds']
-                            self.push_to_dict('{}_1_{}_proceeds'.format(index, str(i)), proceeds)
-                            cost = t['Cost']
-                            self.push_to_dict('{}_1_{}_cost'.format(index, str(i)), cost)
-
-                            if 'WashSaleValue' in t:
-                                adj = t['WashSaleValue']
-                                self.push_to_dict('{}_1_{}_adjustment'.format(index, str(i)), adj)
-                                self.d['{}_1_{}_code'.format(index, str(i))] = t['WashSaleCode']
-                            else:
-                                adj = 0
-
-                            gain = round(proceeds) - round(cost) + round(adj)
-                            self.push_to_dict('{}_1_{}_gain'.format(index, str(i)), gain)
-
-                        s_proceeds += round(proceeds)
-                        s_cost += round(cost)
-                        s_adj += round(adj)
-                        s_gain += round(gain)
-
-                    self.push_to_dict('{}_2_proceeds'.format(index), s_proceeds)
-                    self.push_to_dict('{}_2_cost'.format(index), s_cost)
-                    self.push_to_dict('{}_2_adjustment'.format(index), s_adj)
-                    self.push_to_dict('{}_2_gain'.format(index), s_gain)
-
-                    sum_trades[ls_key][code]['Proceeds'] += round(s_proceeds)
-                    sum_trades[ls_key][code]['Cost'] += round(s_cost)
-                    sum_trades[ls_key][code]['Adjustment'] += round(s_adj)
-                    sum_trades[ls_key][code]['Gain'] += round(s_gain)
+                            self.d['{}_1_{}_date_acq'.format(index, str(i))] = lot.date_acq
+                            self.d['{}_1_{}_date_sold'.format(index, str(i))] = lot.date_sold
+
+                            self.push_to_dict('{}_1_{}_proceeds'.format(index, str(i)), lot.proceeds)
+                            self.push_to_dict('{}_1_{}_cost'.format(index, str(i)), lot.cost)
+                            if lot.code is not None:
+                                self.push_to_dict('{}_1_{}_adjustment'.format(index, str(i)), lot.adjustment)
+                                self.d['{}_1_{}_code'.format(index, str(i))] = lot.code
+
+                            self.push_to_dict('{}_1_{}_gain'.format(index, str(i)), lot.gain)
+
+                    totals = code_lots.totals()
+                    self.push_to_dict('{}_2_proceeds'.format(index), totals['Proceeds'])
+                    self.push_to_dict('{}_2_cost'.format(index), totals['Cost'])
+                    self.push_to_dict('{}_2_adjustment'.format(index), totals['Adjustment'])
+                    self.push_to_dict('{}_2_gain'.format(index), totals['Gain'])
 
             # code is A, B, or C
 
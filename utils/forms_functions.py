@@ -1,4 +1,8 @@
-from utils.forms_constants import logger, override_keyword
+from numbers import Real
+from bisect import bisect_left
+from collections import namedtuple
+import numpy as np
+from utils.forms_constants import logger, override_keyword, trade_lots_keyword
 
 
 def get_main_info(d):
@@ -46,144 +50,262 @@ def get_main_info(d):
     return info
 
 
-def computation_2018(amount):
-    if amount == 0:
-        return 0
-    if amount <= 157500:
-        return amount * 0.24 - 5710.50
-    if amount <= 200000:
-        return amount * 0.32 - 18310.50
-    if amount <= 500000:
-        return amount * 0.35 - 24310.50
-    return amount * 0.37 - 34310.50
+trade_terms = ['SHORT', 'LONG']
+trade_codes = ['A', 'B', 'C', 'D', 'E', 'F']
 
 
-def computation_2019(amount):
-    if amount == 0:
-        return 0
-    if amount <= 160725:
-        return amount * 0.24 - 5825.50
-    if amount <= 204100:
-        return amount * 0.32 - 18683.50
-    if amount <= 510300:
-        return amount * 0.35 - 24806.50
-    return amount * 0.37 - 35012.50
+def bucket_trades(accounts):
+    # single pass over the 1099 trades -> {(term, code): trades in input order}
+    # term is matched inside LongShort, codes other than A-F are left out, as the 8949 always did
+    buckets = {(term, code): [] for term in trade_terms for code in trade_codes}
+    for uu in accounts:  # remove crypto transactions
+        if 'Trades' in uu:
+            for tt in uu['Trades']:
+                for term in trade_terms:
+                    if term in tt['LongShort']:
+                        bucket = buckets.get((term, tt['FormCode']))
+                        if bucket is not None:
+                            bucket.append(tt)
+    return buckets
 
 
-def computation_2020(amount):
-    if amount == 0:
-        return 0
-    if amount <= 163300:
-        return amount * 0.24 - 5920.50
-    if amount <= 207350:
-        return amount * 0.32 - 18984.50
-    if amount <= 518400:
-        return amount * 0.35 - 25205
-    return amount * 0.37 - 35573
+def paginate_trades(buckets, per_page):
+    # 8949 pages in filing order, a page is (code, {'SHORT': trades, 'LONG': trades}) with per_page trades at most
+    # buckets values are anything sliceable, trade lists or TradeColumns
+    pages = []
+    for code in trade_codes:
+        short, long = buckets[('SHORT', code)], buckets[('LONG', code)]
+        for start in range(0, max(len(short), len(long)), per_page):
+            pages.append((code, {'SHORT': short[start:start + per_page], 'LONG': long[start:start + per_page]}))
+    return pages
 
 
-def computation_2021(amount):
-    if amount == 0:
-        return 0
-    if amount <= 164925:
-        return amount * 0.24 - 5979.00
-    if amount <= 209425:
-        return amount * 0.32 - 19173.00
-    if amount <= 523600:
-        return amount * 0.35 - 25455.75
-    return amount * 0.37 - 35927.75
+# one 8949 line: amounts as given, gain rounded (as given for a gain_only lot)
+Lot = namedtuple('Lot', ['description', 'date_acq', 'date_sold', 'code', 'gain_only',
+                         'proceeds', 'cost', 'adjustment', 'gain'])
 
 
-def computation_2022(amount):
-    if amount == 0:
-        return 0
-    if amount <= 170050:
-        return amount * 0.24 - 6164.50
-    if amount <= 215950:
-        return amount * 0.32 - 19768.50
-    if amount <= 539900:
-        return amount * 0.35 - 26247.00
-    return amount * 0.37 - 37045.00
-
-
-def computation_2023(amount):
-    if amount == 0:
-        return 0  # not actually zero, but use the tables
-    if amount <= 182_100:
-        return amount * 0.24 - 6600.00
-    if amount <= 231_250:
-        return amount * 0.32 - 21168.00
-    if amount <= 578_125:
-        return amount * 0.35 - 28105.50
-    return amount * 0.37 - 39668.00
-
-
-def computation_2023_ny(amount):
-    if amount <= 17_150:
-        return amount * 0.04
-    if amount <= 23_600:
-        return 686 + (amount - 17_150) * 0.045
-    if amount <= 27_900:
-        return 976 + (amount - 23_600) * 0.0525
-    if amount <= 161_550:
-        return 1_202 + (amount - 27_900) * 0.0550
-    if amount <= 323_200:
-        return 8_553 + (amount - 161_550) * 0.06
-    if amount <= 2_155_350:
-        return 18_252 + (amount - 323_200) * 0.0685
-    if amount <= 5_000_000:
-        return 143_754 + (amount - 2_155_350) * 0.0965
-    if amount <= 25_000_000:
-        return 418_263 + (amount - 5_000_000) * 0.1030
-    return 2_478_263 + (amount - 25_000_000) * 0.1090
-
-
-def computation_2023_nyc(amount):
-    # I mistakenly put head-of-household table instead of single
-    if amount <= 21_600:
-        return amount * 0.03078
-    if amount <= 45_000:
-        return 665 + (amount - 21_600) * 0.03762
-    if amount <= 90_000:
-        return 1_545 + (amount - 45_000) * 0.03819
-    return 3_264 + (amount - 90_000) * 0.03876
-
-
-def computation_2024(amount):
-    if amount <= 11_600:
-        return amount * 0.10
-    if amount <= 47_150:
-        return 1_160 + (amount - 11_700) * 0.12
-    if amount <= 100_525:
-        return 5_426 + (amount - 47_150) * 0.22
-    if amount <= 191_950:
-        return 17_168.50 + (amount - 100_525) * 0.24
-    if amount <= 243_725:
-        return 39_110.50 + (amount - 191_950) * 0.32
-    if amount <= 609_350:
-        return 55_678.50 + (amount - 243_725) * 0.35
-    return 183_647.25 + (amount - 609_350) * 0.37
-
-
-def computation_2024_ny(amount):
-    # same comment as for NYC
-    if amount <= 8_500:
-        return amount * 0.04
-    if amount <= 11_700:
-        return 340 + (amount - 8_500) * 0.045
-    if amount <= 13_900:
-        return 484 + (amount - 11_700) * 0.05_25
-    if amount <= 80_650:
-        return 600 + (amount - 13_900) * 0.05_50
-    if amount <= 215_400:
-        return 4_271 + (amount - 80_650) * 0.06
-    if amount <= 1_077_550:
-        return 12_356 + (amount - 215_400) * 0.06_85
-    if amount <= 5_000_000:
-        return 71_413 + (amount - 1_077_550) * 0.09_65
-    if amount <= 25_000_000:
-        return 449_929 + (amount - 5_000_000) * 0.10_30
-    return 2_509_929 + (amount - 25_000_000) * 0.10_90
+class TradeColumns:
+    # 8949 lots of one bucket as columns, the trade dicts are not kept
+    # text: the strings of the page lines, code is the wash sale code, None for a lot without adjustment
+    # gain_only: Form 6781 lines (dict(a=description, h=gain)), they only have a gain
+    # amounts: proceeds, cost, adjustment, gain as given, float64 with one row per lot, columns as in fields
+    # rounded: the same to whole dollars, int64, gain is round(proceeds) - round(cost) + round(adjustment)
+    # slicing gives the lots of a page, + appends lots, totals are the 8949 line 2 / 1040sd amounts
+    fields = ['Proceeds', 'Cost', 'Adjustment', 'Gain']
+    text_fields = ['description', 'date_acq', 'date_sold', 'code']
+
+    def __init__(self, trades=(), columns=None):
+        if columns is None:
+            columns = self.from_trades(trades)
+        self.text, self.gain_only, self.amounts, self.rounded = columns
+
+    @classmethod
+    def from_trades(cls, trades):
+        text = {f: [] for f in cls.text_fields}
+        gain_only = []
+        amounts = []
+        for t in trades:
+            if 'a' in t:
+                row = (t['a'], None, None, None)
+                amounts.append((0, 0, 0, t['h']))
+            else:
+                row = (f"{t['Shares']} {t['SalesDescription']}", t['DateAcquired'], t['DateSold'],
+                       t['WashSaleCode'] if 'WashSaleValue' in t else None)
+                amounts.append((t['Proceeds'], t['Cost'], t.get('WashSaleValue', 0), 0))
+            gain_only.append('a' in t)
+            for f, v in zip(cls.text_fields, row):
+                text[f].append(v)
+        amounts = np.array(amounts, dtype=float).reshape(-1, 4)
+        rounded = np.rint(amounts).astype(np.int64)
+        rounded[:, 3] += rounded[:, 0] - rounded[:, 1] + rounded[:, 2]
+        return text, np.array(gain_only, dtype=bool), amounts, rounded
+
+    def __len__(self):
+        return len(self.rounded)
+
+    def __getitem__(self, s):
+        return TradeColumns(columns=({f: v[s] for f, v in self.text.items()}, self.gain_only[s], self.amounts[s],
+                                     self.rounded[s]))
+
+    def __add__(self, other):
+        return TradeColumns(columns=(
+            {f: v + other.text[f] for f, v in self.text.items()},
+            np.concatenate([self.gain_only, other.gain_only]),
+            np.concatenate([self.amounts, other.amounts]),
+            np.concatenate([self.rounded, other.rounded]),
+        ))
+
+    @property
+    def gain(self):
+        return self.rounded[:, 3]
+
+    def lots(self):
+        gain_only = self.gain_only.tolist()
+        amounts = self.amounts.tolist()
+        gains = self.gain.tolist()
+        for i, text in enumerate(zip(*(self.text[f] for f in self.text_fields))):
+            proceeds, cost, adjustment, gain = amounts[i]
+            yield Lot(*text, gain_only[i], proceeds, cost, adjustment, gain if gain_only[i] else gains[i])
+
+    def totals(self):
+        return dict(zip(self.fields, self.rounded.sum(axis=0).tolist()))
+
+
+def trade_lots(accounts):
+    # {(term, code): TradeColumns} of the 1099 trades
+    return {key: TradeColumns(trades) for key, trades in bucket_trades(accounts).items()}
+
+
+def attach_trade_lots(d):
+    # the 8949 lots of the input dict d, built once when the input is gathered instead of at every Form8949 build
+    # to call again whenever d['1099'] is edited, Form8949 builds them itself for an input without them
+    d[trade_lots_keyword] = trade_lots(d.get('1099', []))
+    return d
+
+
+class BracketTable:
+    # one (year, jurisdiction, filing status) tax table
+    # rows are (upper, base, start, rate): tax = base + (amount - start) * rate
+    # for the first row with amount <= upper - rows sorted by upper, last upper is inf
+    # a row with rate 0 is a flat amount (base)
+    # at_zero is what an amount of exactly 0 gives when the table has a special case for it, negative amounts
+    # still go through the rows
+    def __init__(self, rows, at_zero=None):
+        self.rows = tuple(rows)
+        self.at_zero = at_zero
+        self.upper = [row[0] for row in self.rows]
+        self.upper_array, self.base_array, self.start_array, self.rate_array = (
+            np.array(column, dtype=float) for column in zip(*self.rows)
+        )
+
+    def __call__(self, amount):
+        # scalar amount -> float, array-like amount -> numpy array
+        if isinstance(amount, Real):  # python and numpy scalars
+            if self.at_zero is not None and amount == 0:
+                return self.at_zero
+            upper, base, start, rate = self.rows[bisect_left(self.upper, amount)]
+            if rate == 0:
+                return base
+            return base + (amount - start) * rate
+        amount = np.asarray(amount, dtype=float)
+        i = np.searchsorted(self.upper_array, amount, side='left')
+        tax = self.base_array[i] + (amount - self.start_array[i]) * self.rate_array[i]
+        if self.at_zero is not None:
+            tax = np.where(amount == 0, self.at_zero, tax)
+        return tax
+
+
+inf = float('inf')
+
+# older federal tables: only the brackets above 100k, the tax tables are not parsed
+computation_2018 = BracketTable([
+    (157_500, -5_710.50, 0, 0.24),
+    (200_000, -18_310.50, 0, 0.32),
+    (500_000, -24_310.50, 0, 0.35),
+    (inf, -34_310.50, 0, 0.37),
+], at_zero=0)
+
+computation_2019 = BracketTable([
+    (160_725, -5_825.50, 0, 0.24),
+    (204_100, -18_683.50, 0, 0.32),
+    (510_300, -24_806.50, 0, 0.35),
+    (inf, -35_012.50, 0, 0.37),
+], at_zero=0)
+
+computation_2020 = BracketTable([
+    (163_300, -5_920.50, 0, 0.24),
+    (207_350, -18_984.50, 0, 0.32),
+    (518_400, -25_205, 0, 0.35),
+    (inf, -35_573, 0, 0.37),
+], at_zero=0)
+
+computation_2021 = BracketTable([
+    (164_925, -5_979.00, 0, 0.24),
+    (209_425, -19_173.00, 0, 0.32),
+    (523_600, -25_455.75, 0, 0.35),
+    (inf, -35_927.75, 0, 0.37),
+], at_zero=0)
+
+computation_2022 = BracketTable([
+    (170_050, -6_164.50, 0, 0.24),
+    (215_950, -19_768.50, 0, 0.32),
+    (539_900, -26_247.00, 0, 0.35),
+    (inf, -37_045.00, 0, 0.37),
+], at_zero=0)
+
+computation_2023 = BracketTable([  # 0 at zero: not actually zero, but use the tables
+    (182_100, -6_600.00, 0, 0.24),
+    (231_250, -21_168.00, 0, 0.32),
+    (578_125, -28_105.50, 0, 0.35),
+    (inf, -39_668.00, 0, 0.37),
+], at_zero=0)
+
+computation_2023_ny = BracketTable([
+    (17_150, 0, 0, 0.04),
+    (23_600, 686, 17_150, 0.045),
+    (27_900, 976, 23_600, 0.0525),
+    (161_550, 1_202, 27_900, 0.0550),
+    (323_200, 8_553, 161_550, 0.06),
+    (2_155_350, 18_252, 323_200, 0.0685),
+    (5_000_000, 143_754, 2_155_350, 0.0965),
+    (25_000_000, 418_263, 5_000_000, 0.1030),
+    (inf, 2_478_263, 25_000_000, 0.1090),
+])
+
+# I mistakenly put head-of-household table instead of single
+computation_2023_nyc = BracketTable([
+    (21_600, 0, 0, 0.03078),
+    (45_000, 665, 21_600, 0.03762),
+    (90_000, 1_545, 45_000, 0.03819),
+    (inf, 3_264, 90_000, 0.03876),
+])
+
+computation_2024 = BracketTable([
+    (11_600, 0, 0, 0.10),
+    (47_150, 1_160, 11_700, 0.12),
+    (100_525, 5_426, 47_150, 0.22),
+    (191_950, 17_168.50, 100_525, 0.24),
+    (243_725, 39_110.50, 191_950, 0.32),
+    (609_350, 55_678.50, 243_725, 0.35),
+    (inf, 183_647.25, 609_350, 0.37),
+])
+
+# same comment as for NYC
+computation_2024_ny = BracketTable([
+    (8_500, 0, 0, 0.04),
+    (11_700, 340, 8_500, 0.045),
+    (13_900, 484, 11_700, 0.05_25),
+    (80_650, 600, 13_900, 0.05_50),
+    (215_400, 4_271, 80_650, 0.06),
+    (1_077_550, 12_356, 215_400, 0.06_85),
+    (5_000_000, 71_413, 1_077_550, 0.09_65),
+    (25_000_000, 449_929, 5_000_000, 0.10_30),
+    (inf, 2_509_929, 25_000_000, 0.10_90),
+])
+
+# looks like it didn't change from previous year
+# but was the wrong table
+computation_2024_nyc = BracketTable([
+    (12_000, 0, 0, 0.03_078),
+    (25_000, 369, 12_000, 0.03_762),
+    (50_000, 858, 25_000, 0.03_819),
+    (inf, 1_813, 50_000, 0.03_876),
+])
+
+tax_brackets = {
+    ("2018", "federal", "single"): computation_2018,
+    ("2019", "federal", "single"): computation_2019,
+    ("2020", "federal", "single"): computation_2020,
+    ("2021", "federal", "single"): computation_2021,
+    ("2022", "federal", "single"): computation_2022,
+    ("2023", "federal", "single"): computation_2023,
+    ("2023", "ny", "single"): computation_2023_ny,
+    ("2023", "nyc", "single"): computation_2023_nyc,
+    ("2024", "federal", "single"): computation_2024,
+    ("2024", "ny", "single"): computation_2024_ny,
+    ("2024", "nyc", "single"): computation_2024_nyc,
+}
 
 
 def computation_2024_ny_recapture(amount, gross):
@@ -198,15 +320,3 @@ def computation_2024_ny_recapture(amount, gross):
     if amount <= 1_077_550:
         return 568 + 1_831 * round(min(50_000, gross - 215_400) / 50_000, 4)
     raise ValueError("Too bored to implement it - computation_2024_ny_recapture")
-
-
-def computation_2024_nyc(amount):
-    # looks like it didn't change from previous year
-    # but was the wrong table
-    if amount <= 12_000:
-        return amount * 0.03_078
-    if amount <= 25_000:
-        return 369 + (amount - 12_000) * 0.03_762
-    if amount <= 50_000:
-        return 858 + (amount - 25_000) * 0.03_819
-    return 1_813 + (amount - 50_000) * 0.03_876
@@ -0,0 +1,235 @@
+from collections import Counter, namedtuple
+
+
+# incremental recomputation of a return
+# every Form.build / Worksheet.build call is a node of the dependency graph
+# a node records the lines it reads (inputs, other forms lines, worksheets, context values)
+# and the effect it has on the return: the final value of every path it wrote
+# paths are ('input', key), ('forms', form), ('forms', form, line), ('worksheets', key), ('summary', label), ('ctx', name)
+# on the next run, a node whose reads are unchanged replays its effect instead of building
+
+MISSING = object()  # value of a line / worksheet that is not there
+
+Record = namedtuple('Record', ['reads', 'written', 'effect', 'children'])  # written is an ordered dict of paths
+
+
+def plain(value):
+    # tracked containers back to plain dict / list, for the outputs and snapshots
+    if isinstance(value, dict):
+        return {k: plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [plain(v) for v in value]
+    return value
+
+
+class TrackedDict(dict):
+    # dict reporting reads / writes of its keys to the recorder, keys are path + (key,)
+    def __init__(self, recorder, path, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.recorder = recorder
+        self.path = path
+
+    def read_value(self, key):
+        return dict.get(self, key, MISSING)
+
+    def __getitem__(self, key):
+        self.recorder.read(self.path + (key,), self.read_value(key))
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        self.recorder.read(self.path + (key,), self.read_value(key))
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        self.recorder.read(self.path + (key,), self.read_value(key))
+        return dict.__contains__(self, key)
+
+    def __setitem__(self, key, value):
+        self.recorder.write(self.path + (key,))
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self.recorder.write(self.path + (key,))
+        dict.__delitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+
+class TrackedInput(TrackedDict):
+    # input dict: only which top-level keys are read, edits are given as the changed keys
+    def read_value(self, key):
+        return None
+
+
+class TrackedForms(TrackedDict):
+    # forms_state: reading a form only depends on it being there, its lines are tracked one by one
+    def read_value(self, key):
+        return dict.__contains__(self, key)
+
+    def __setitem__(self, key, value):
+        if isinstance(value, dict):
+            value = TrackedDict(self.recorder, self.path + (key,), value)
+        TrackedDict.__setitem__(self, key, value)
+
+
+class TrackedAttributes:
+    # mixin for the return context, attribute reads / writes are reported to the recorder
+    untracked_attributes = {'recorder'}
+
+    def __getattribute__(self, name):
+        value = object.__getattribute__(self, name)
+        if name[0] != '_' and name not in type(self).untracked_attributes:
+            recorder = object.__getattribute__(self, 'recorder')
+            if recorder is not None:
+                recorder.read(('ctx', name), value)
+        return value
+
+    def __setattr__(self, name, value):
+        recorder = self.__dict__.get('recorder')
+        if recorder is not None and name not in type(self).untracked_attributes:
+            recorder.write(('ctx', name))
+        object.__setattr__(self, name, value)
+
+    def tracked_attributes(self):
+        return {k: v for k, v in self.__dict__.items() if k not in type(self).untracked_attributes}
+
+
+class Frame:
+    def __init__(self):
+        self.reads = {}
+        self.written = {}  # path -> None, in first write order
+        self.children = []
+
+
+class Recorder:
+    # previous is the trace of the last run, changed_inputs the top-level input keys edited since
+    def __init__(self, ctx, previous=None, changed_inputs=()):
+        self.ctx = ctx
+        self.previous = previous or {}
+        self.changed_inputs = set(changed_inputs)
+        self.trace = {}  # node -> Record, for the next run
+        self.frames = []
+        self.counts = Counter()
+        self.reused = []
+        self.rebuilt = []
+
+    @staticmethod
+    def _is_written(frame, path):
+        return path in frame.written or (len(path) == 3 and path[:2] in frame.written)
+
+    def read(self, path, value):
+        if not self.frames:
+            return
+        frame = self.frames[-1]
+        if path in frame.reads or self._is_written(frame, path):
+            return
+        frame.reads[path] = plain(value)
+
+    def write(self, path):
+        if self.frames:
+            self.frames[-1].written.setdefault(path)
+
+    def _merge(self, reads, written):
+        # a child node reads / writes on behalf of its parent too
+        if not self.frames:
+            return
+        frame = self.frames[-1]
+        for path, value in reads.items():
+            if path not in frame.reads and not self._is_written(frame, path):
+                frame.reads[path] = value
+        for path in written:
+            frame.written.setdefault(path)
+
+    def _lookup(self, path):
+        kind = path[0]
+        if kind == 'ctx':
+            return object.__getattribute__(self.ctx, path[1])
+        container = object.__getattribute__(self.ctx, self.containers[kind])
+        value = dict.get(container, path[1], MISSING)
+        if len(path) == 3:
+            value = dict.get(value, path[2], MISSING) if isinstance(value, dict) else MISSING
+        return value
+
+    containers = {'forms': 'forms_state', 'worksheets': 'worksheets', 'summary': 'summary_info'}
+
+    def is_valid(self, record):
+        for path, value in record.reads.items():
+            if path[0] == 'input':
+                if path[1] in self.changed_inputs:
+                    return False
+            elif path[0] == 'forms' and len(path) == 2:
+                if (self._lookup(path) is not MISSING) != value:
+                    return False
+            elif self._lookup(path) != value:
+                return False
+        return True
+
+    def _effect(self, frame):
+        # context values are also mutated in place (sum_trades), compare them with what was read
+        for path, value in frame.reads.items():
+            if path[0] == 'ctx' and isinstance(value, (dict, list)) and plain(self._lookup(path)) != value:
+                frame.written.setdefault(path)
+        return [(path, plain(self._lookup(path))) for path in frame.written
+                if not (len(path) == 3 and path[:2] in frame.written)]
+
+    def _apply(self, effect):
+        ctx = self.ctx
+        for path, value in effect:
+            kind = path[0]
+            if kind == 'ctx':
+                object.__setattr__(ctx, path[1], plain(value))
+                continue
+            container = object.__getattribute__(ctx, self.containers[kind])
+            if len(path) == 3:
+                container = dict.__getitem__(container, path[1])
+            key = path[-1]
+            if value is MISSING:
+                dict.pop(container, key, None)
+            elif kind == 'worksheets' and dict.__contains__(container, key):
+                dict.__getitem__(container, key)[:] = value
+            else:
+                value = plain(value)
+                if kind == 'forms' and len(path) == 2 and isinstance(value, dict):
+                    value = TrackedDict(self, path, value)
+                dict.__setitem__(container, key, value)
+
+    def _keep(self, node, record):
+        # reused nodes keep their subtree in the trace, and the node numbering in sync
+        self.trace[node] = record
+        name, i = node
+        self.counts[name] = max(self.counts[name], i + 1)
+        for child in record.children:
+            if child in self.previous:
+                self._keep(child, self.previous[child])
+
+    def run(self, form, build, owned=None):
+        # owned is the path of a container the build mutates in place (its worksheet)
+        name = type(form).__name__
+        node = (name, self.counts[name])
+        self.counts[name] += 1
+        if self.frames:
+            self.frames[-1].children.append(node)
+
+        record = self.previous.get(node)
+        if record is not None and self.is_valid(record):
+            self._apply(record.effect)
+            self._merge(record.reads, record.written)
+            self._keep(node, record)
+            self.reused.append(node)
+            return None
+
+        frame = Frame()
+        if owned is not None:
+            frame.written[owned] = None
+        self.frames.append(frame)
+        try:
+            result = build(form)
+        finally:
+            self.frames.pop()
+        record = Record(reads=frame.reads, written=frame.written, effect=self._effect(frame), children=frame.children)
+        self.trace[node] = record
+        self._merge(record.reads, record.written)
+        self.rebuilt.append(node)
+        return result
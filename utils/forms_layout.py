@@ -0,0 +1,163 @@
+import sys
+from collections import namedtuple
+
+from utils.forms_constants import ANNOT_KEY, ANNOT_FIELD_KEY, ANNOT_RECT_KEY, SUBTYPE_KEY, WIDGET_SUBTYPE_KEY
+from utils.forms_utils import load_template, template_keys
+
+
+# geometry of the form widgets, to draft the fields files of fill_keys.fields_definition for a new form / year
+# widgets are indexed per page on a grid of cells, rows come from one sweep over the widgets sorted by top edge,
+# tables are runs of evenly spaced rows with the same columns: a sort and linear passes, O(n log n) per page
+# pdf coordinates: points, y going up
+
+# position: order of the widget in the numbered .keys, which is the order the fields file lines consume widgets in
+# number: the widget number written in the key_mapping debug pdf, see build_keys.debug_pdfs
+# rectangle of the first widget of that name, None if it has no /Rect
+Box = namedtuple('Box', ['position', 'number', 'key', 'field_type', 'page', 'x0', 'y0', 'x1', 'y1'])
+
+grid_cell = 36  # points, half an inch
+row_overlap = 0.5  # two widgets are on one row when they overlap by that much of the smaller height
+column_overlap = 0.5  # same for two widgets in one column, with widths
+pitch_tolerance = 0.25  # spacing of the rows of a table, relative to the first spacing
+table_min_rows = 3
+
+
+def overlap(a0, a1, b0, b1):
+    return min(a1, b1) - max(a0, b0)
+
+
+def widget_boxes(file):
+    # one box per widget name, in the numbered .keys order
+    rects = {}
+    for page_number, page in enumerate(load_template(file).pdf.pages):
+        if ANNOT_KEY in page:
+            for annotation in page[ANNOT_KEY]:
+                if annotation[SUBTYPE_KEY] == WIDGET_SUBTYPE_KEY and annotation[ANNOT_FIELD_KEY]:
+                    key = annotation[ANNOT_FIELD_KEY][1:-1]
+                    if key not in rects and annotation[ANNOT_RECT_KEY]:
+                        x0, y0, x1, y1 = (float(v) for v in annotation[ANNOT_RECT_KEY])
+                        rects[key] = page_number, min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+    return [
+        Box(position, number, key, field_type, *rects.get(key, (None,) * 5))
+        for position, (number, key, field_type) in enumerate(template_keys(file))
+    ]
+
+
+class WidgetIndex:
+    # widgets of a template by page, with a grid of cells for rectangle queries
+    def __init__(self, boxes, cell=grid_cell):
+        self.boxes = boxes
+        self.cell = cell
+        self.pages = {}  # page -> boxes
+        self.grid = {}  # (page, column, row) cell -> boxes overlapping it
+        for box in boxes:
+            if box.page is None:
+                continue
+            self.pages.setdefault(box.page, []).append(box)
+            for cell in self.cells(box.page, box.x0, box.y0, box.x1, box.y1):
+                self.grid.setdefault(cell, []).append(box)
+
+    @classmethod
+    def from_template(cls, file):
+        return cls(widget_boxes(file))
+
+    def cells(self, page, x0, y0, x1, y1):
+        for i in range(int(x0 // self.cell), int(x1 // self.cell) + 1):
+            for j in range(int(y0 // self.cell), int(y1 // self.cell) + 1):
+                yield page, i, j
+
+    def query(self, page, x0, y0, x1, y1):
+        # widgets of the page overlapping the rectangle, in widget order
+        found = {}
+        for cell in self.cells(page, x0, y0, x1, y1):
+            for box in self.grid.get(cell, ()):
+                if overlap(box.x0, box.x1, x0, x1) > 0 and overlap(box.y0, box.y1, y0, y1) > 0:
+                    found[box.position] = box
+        return [found[position] for position in sorted(found)]
+
+    def rows(self, page):
+        # widgets of the page grouped in rows, top to bottom, a row left to right
+        # a widget joins the current row when it overlaps the band shared by the widgets already in it
+        rows = []
+        band = None
+        for box in sorted(self.pages.get(page, ()), key=lambda b: (-b.y1, b.x0)):
+            shared = overlap(box.y0, box.y1, *band) if band else 0
+            if shared > 0 and shared >= row_overlap * min(box.y1 - box.y0, band[1] - band[0]):
+                rows[-1].append(box)
+                band = max(band[0], box.y0), min(band[1], box.y1)
+            else:
+                rows.append([box])
+                band = box.y0, box.y1
+        return [sorted(row, key=lambda b: b.x0) for row in rows]
+
+    @staticmethod
+    def same_columns(row, previous):
+        return len(row) == len(previous) and all(
+            a.field_type == b.field_type
+            and overlap(a.x0, a.x1, b.x0, b.x1) >= column_overlap * min(a.x1 - a.x0, b.x1 - b.x0)
+            for a, b in zip(row, previous)
+        )
+
+    def tables(self, page, min_rows=table_min_rows):
+        # runs of at least min_rows rows of two widgets or more, same columns, evenly spaced
+        tables = []
+        run = []
+        for row in self.rows(page):
+            if run and len(row) > 1 and self.same_columns(row, run[-1]):
+                if len(run) == 1:
+                    run.append(row)
+                    continue
+                pitch = run[0][0].y1 - run[1][0].y1
+                if abs(run[-1][0].y1 - row[0].y1 - pitch) <= pitch_tolerance * pitch:
+                    run.append(row)
+                elif len(run) >= min_rows:
+                    tables.append(run)
+                    run = [row]
+                else:
+                    run = [run[-1], row]  # the rows above were a header, the table starts at the previous row
+                continue
+            if len(run) >= min_rows:
+                tables.append(run)
+            run = [row] if len(row) > 1 else []
+        if len(run) >= min_rows:
+            tables.append(run)
+        return tables
+
+    @staticmethod
+    def columns(table):
+        # horizontal extent of every column of a table
+        return [(min(b.x0 for b in column), max(b.x1 for b in column)) for column in zip(*table)]
+
+
+def propose_fields(file, min_rows=table_min_rows):
+    # draft fields file for the template, in widget order:
+    # one "table<t>_<r> c1 c2 ..." line per table row whose widgets follow each other left to right,
+    # the widget number (as in the key_mapping debug pdf) for every other widget, to rename by hand
+    index = WidgetIndex.from_template(file)
+    row_lines = {}  # position of the first widget of a row -> (fields line, widgets in the row)
+    t = 0
+    for page in sorted(index.pages):
+        for table in index.tables(page, min_rows):
+            t += 1
+            for r, row in enumerate(table, 1):
+                positions = [b.position for b in row]
+                if positions == list(range(positions[0], positions[0] + len(row))):
+                    columns = "".join(f" c{c}" for c in range(1, len(row) + 1))
+                    row_lines[positions[0]] = f"table{t}_{r}{columns}", len(row)
+    lines = []
+    position = 0
+    while position < len(index.boxes):
+        if position in row_lines:
+            line, n = row_lines[position]
+            lines.append(line)
+            position += n
+        else:
+            lines.append("w" + index.boxes[position].number)
+            position += 1
+    return "".join(line + "\n" for line in lines)
+
+
+if __name__ == "__main__":
+    for f in sys.argv[1:]:
+        print(f"# {f}")
+        print(propose_fields(f), end="")
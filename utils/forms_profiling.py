@@ -0,0 +1,80 @@
+import json
+import time
+
+
+# opt-in timing of the Form.build / Worksheet.build calls of a return, see fill_taxes_2024(profiler=...)
+# every call is timed with the stack of builds it runs in, e.g. Form1040 > Form1040sd > CapitalLossCarryoverWorksheet
+# per form: calls, total time (inclusive, nested builds counted once), self time, lines it holds in forms_state
+# exports as json or as folded stacks (one "a;b;c microseconds" line per stack) for flamegraph.pl / speedscope
+
+class BuildProfiler:
+    def __init__(self):
+        self.stack = []
+        self.stacks = {}  # stack of names -> [calls, seconds, seconds spent in nested builds]
+        self.forms = {}  # name -> dict(calls, seconds, self_seconds, lines)
+
+    @staticmethod
+    def lines(form):
+        # size of what the form / worksheet holds once built, without going through tracked containers
+        if form.owned_path() is not None:  # worksheet
+            return len(form.d)
+        content = dict.get(form.ctx.forms_state, form.key)
+        if isinstance(content, list):
+            return sum(len(one) for one in content)
+        return len(content) if content is not None else 0
+
+    def run(self, form, build):
+        name = type(form).__name__
+        self.stack.append(name)
+        key = tuple(self.stack)
+        start = time.perf_counter()
+        try:
+            return build(form)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stack.pop()
+            entry = self.stacks.setdefault(key, [0, 0., 0.])
+            entry[0] += 1
+            entry[1] += elapsed
+            if self.stack:
+                self.stacks.setdefault(tuple(self.stack), [0, 0., 0.])[2] += elapsed
+
+            stats = self.forms.setdefault(name, dict(calls=0, seconds=0., self_seconds=0., lines=0))
+            stats['calls'] += 1
+            if name not in self.stack:  # a build nested in one of the same form is already in the outer time
+                stats['seconds'] += elapsed
+            stats['lines'] = max(stats['lines'], self.lines(form))
+
+    def self_seconds(self):
+        # stack -> time spent in that build itself, nested builds taken out
+        return {key: seconds - nested for key, (calls, seconds, nested) in self.stacks.items()}
+
+    def finish(self):
+        for stats in self.forms.values():
+            stats['self_seconds'] = 0.
+        for key, seconds in self.self_seconds().items():
+            self.forms[key[-1]]['self_seconds'] += seconds
+        return self
+
+    def to_json(self, out=None):
+        self.finish()
+        data = dict(
+            forms=dict(sorted(self.forms.items(), key=lambda item: -item[1]['self_seconds'])),
+            stacks=[
+                dict(stack=list(key), calls=calls, seconds=seconds, self_seconds=seconds - nested)
+                for key, (calls, seconds, nested) in self.stacks.items()
+            ],
+        )
+        if out is not None:
+            with open(out, 'w') as f:
+                json.dump(data, f, indent=4)
+        return data
+
+    def to_folded(self, out=None):
+        # flamegraph input, self time in microseconds
+        lines = [f"{';'.join(key)} {round(seconds * 1e6)}" for key, seconds in self.self_seconds().items()]
+        text = "\n".join(lines) + "\n"
+        if out is not None:
+            with open(out, 'w') as f:
+                f.write(text)
+        return text
@@ -1,72 +1,271 @@
 import os
 import glob
 import re
+import hashlib
+import pickle
+import threading
+from collections import namedtuple
+from functools import lru_cache
 import pdfrw
 from utils.forms_constants import *
 
 
-def map_folders(name, year_folder):
-    if not os.path.isdir(name):
-        os.mkdir(name)
+# where key matching reads the blank forms and writes its key_mapping / fields_mapping files
+KeysFolders = namedtuple('KeysFolders', ['forms', 'key_mapping', 'fields_mapping'])
+default_keys_folders = KeysFolders(forms=forms_folder, key_mapping=key_mapping_folder,
+                                   fields_mapping=fields_mapping_folder)
+
+
+def map_folders(name, year_folder, forms_root=forms_folder):
+    # name/<year>/<sub> for every forms_root/<year>/<sub>, several years may be mapped at once
     year_name = os.path.join(name, year_folder)
-    if not os.path.isdir(year_name):
-        os.mkdir(year_name)
-    forms_year_folder = os.path.join(forms_folder, year_folder)
+    os.makedirs(year_name, exist_ok=True)
+    forms_year_folder = os.path.join(forms_root, year_folder)
     for u in glob.glob(os.path.join(forms_year_folder, "*", "")):
         rel = os.path.relpath(u, forms_year_folder)
         u_path = os.path.join(year_name, rel)
         if not os.path.isdir(u_path):
-            os.mkdir(u_path)
+            os.makedirs(u_path, exist_ok=True)
             logger.info("Folders created %s", u_path)
     logger.info("Folders created for %s - Done", name)
 
 
-def load_keys(file, out_dict=True):
+def parse_keys(lines, out_dict=True):
+    # lines of a .keys file, with their line ends
     if out_dict:
         d = {}
     else:
         d = []
-    with open(file, 'r') as f:
-        logger.info("Loading keys from %s", file)
-        for l in f:
-            if l[0] == '#':  # ignore comments
-                continue
-            s = re.split(r'[ \t\n]+', l)
-            if out_dict:
-                d[s[1]] = s[0], s[2]  # some random stuff at the end
-            else:
-                d.append((s[0], s[1], s[2]))
+    for l in lines:
+        if l[0] == '#':  # ignore comments
+            continue
+        s = re.split(r'[ \t\n]+', l)
+        if out_dict:
+            d[s[1]] = s[0], s[2]  # some random stuff at the end
+        else:
+            d.append((s[0], s[1], s[2]))
     return d
 
 
-def fill_pdf_from_keys(file, out_file, d):
-    # file is the pdf file
-    # d is the dictionary mapping the annotation fields to values
-    template_pdf = pdfrw.PdfReader(file)
+def keys_text(keys):
+    # (first, second, type) triples as .keys lines
+    return "".join("\t\t".join(u) + "\n" for u in keys)
+
+
+def load_keys(file, out_dict=True):
+    with open(file, 'r') as f:
+        logger.info("Loading keys from %s", file)
+        return parse_keys(f, out_dict=out_dict)
+
 
-    for annotations in template_pdf.pages:
+def template_keys(file):
+    # (number, widget name, field type) per widget of the blank form, the content of its numbered .keys
+    d = {}
+    d_type = {}  # /Tx for text /Btn for button
+    i = 0
+    for annotations in load_template(file).pdf.pages:
         if ANNOT_KEY in annotations:
             for annotation in annotations[ANNOT_KEY]:
                 if annotation[SUBTYPE_KEY] == WIDGET_SUBTYPE_KEY:
                     if annotation[ANNOT_FIELD_KEY]:
                         key = annotation[ANNOT_FIELD_KEY][1:-1]
-                        if key in d.keys():
-                            if annotation[ANNOT_FIELD_TYPE_KEY] == ANNOT_FIELD_TYPE_BTN:
-                                if d[key]:
-                                    annotation.update(pdfrw.PdfDict(AS=next(iter(annotation['/AP']['/N']))))
-                                else:
-                                    annotation.update(pdfrw.PdfDict(AS='Off'))
-                            elif annotation[ANNOT_FIELD_TYPE_KEY] == ANNOT_FIELD_TYPE_TXT:
-                                r = d[key]
-                                if isinstance(r, float) and r == round(r):
-                                    r = int(r)
-                                elif isinstance(r, float) and r != round(r, 2):
-                                    r = f'{r:.2f}'
-                                annotation.update(
-                                    pdfrw.PdfDict(V=f'{r}')
-                                )
+                        fields_type = annotation[ANNOT_FIELD_TYPE_KEY]
+                        d[key] = str(i)
+                        d_type[key] = fields_type
+                        i += 1
+    return [(i, k, d_type[k]) for k, i in d.items()]
+
+
+_keys_index = {}  # forms/<year> folder -> {form: entry}, loaded once per process
+_keys_index_lock = threading.Lock()  # several threads may load the same year
+
+
+def _read_keys_index(year_folder_path):
+    index_file = os.path.join(year_folder_path, keys_index_file)
     try:
-        pdfrw.PdfWriter().write(out_file, template_pdf)
+        with open(index_file, 'rb') as f:
+            version, entries = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError) as e:
+        logger.debug("No usable keys index %s -- %s", index_file, e)
+        return {}
+    if version != keys_index_version:
+        logger.info("Keys index %s has version %s, expected %s - rebuilding", index_file, version, keys_index_version)
+        return {}
+    return entries
+
+
+def _write_keys_index(year_folder_path, entries):
+    index_file = os.path.join(year_folder_path, keys_index_file)
+    tmp_file = f"{index_file}.{os.getpid()}.{threading.get_ident()}.tmp"  # per thread, the replace is atomic
+    with open(tmp_file, 'wb') as f:
+        pickle.dump((keys_index_version, entries), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, index_file)  # atomic, concurrent writers don't corrupt it
+    logger.info("Keys index saved %s", index_file)
+
+
+def _update_keys_entry(year_folder_path, entries, form):
+    # entry of form up to date with its .keys file, returns True when it changed
+    file = os.path.join(year_folder_path, form + keys_extension)
+    mtime = os.stat(file).st_mtime_ns
+    entry = entries.get(form)
+    if entry is not None and entry['mtime'] == mtime:
+        return False
+
+    with open(file, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    if entry is None or entry['digest'] != digest:
+        by_annotation = load_keys(file)
+        by_field = {}
+        for annotation, (field, _) in by_annotation.items():
+            by_field.setdefault(field, []).append(annotation)
+        entry = dict(digest=digest, by_annotation=by_annotation, by_field=by_field)
+    entry['mtime'] = mtime
+    entries[form] = entry
+    return True
+
+
+def _load_year_keys_index(year_folder_path):
+    # every .keys of the year brought up to date at once, the index file is written once if anything changed
+    entries = _read_keys_index(year_folder_path)
+    changed = False
+    for file in glob.glob(os.path.join(year_folder_path, "*", "*" + keys_extension)):
+        form = os.path.splitext(os.path.relpath(file, year_folder_path))[0].replace(os.sep, "/")
+        changed |= _update_keys_entry(year_folder_path, entries, form)
+    if changed:
+        _write_keys_index(year_folder_path, entries)
+    return entries
+
+
+def load_keys_index(year_folder_path, form):
+    # compiled version of load_keys for forms/<year>/<form>.keys
+    # returns (annotation -> (field, type), field -> [annotations])
+    # entries are reused while the .keys file mtime or content hash is unchanged
+    with _keys_index_lock:
+        if year_folder_path not in _keys_index:
+            _keys_index[year_folder_path] = _load_year_keys_index(year_folder_path)
+        entries = _keys_index[year_folder_path]
+        if _update_keys_entry(year_folder_path, entries, form):  # .keys changed since the year was loaded
+            _write_keys_index(year_folder_path, entries)
+        entry = entries[form]
+    return entry['by_annotation'], entry['by_field']
+
+
+Template = namedtuple('Template', ['pdf', 'annotations'])
+Widget = namedtuple('Widget', ['annotation', 'field_type', 'on_state'])
+
+
+def _text_update(widget, value):
+    if isinstance(value, float) and value == round(value):
+        value = int(value)
+    elif isinstance(value, float) and value != round(value, 2):
+        value = f'{value:.2f}'
+    return pdfrw.PdfDict(V=f'{value}')
+
+
+def _button_update(widget, value):
+    return pdfrw.PdfDict(AS=widget.on_state if value else 'Off')
+
+
+_widget_updates = {
+    ANNOT_FIELD_TYPE_TXT: _text_update,
+    ANNOT_FIELD_TYPE_BTN: _button_update,
+}
+
+
+def _resolve_all(root):
+    # pdfrw reads an indirect object the first time it is accessed, and stores it in the dict / array holding it:
+    # everything read once here, afterwards a template is only read, by any number of threads at once
+    # (pdf files going through one writer, the pages of several forms in one merged pdf)
+    seen = set()
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, pdfrw.PdfDict):
+            stack.extend(value for _, value in obj.iteritems())
+        elif isinstance(obj, pdfrw.PdfArray):
+            stack.extend(obj)
+
+
+@lru_cache(maxsize=template_cache_size)
+def _load_template(file, mtime):
+    # parsed once per (file, mtime), least recently used templates are dropped
+    # the cached template is shared and never changed, fills work on copies of what they touch
+    template_pdf = pdfrw.PdfReader(file)
+    _resolve_all(template_pdf)
+    annotations = {}  # widget /T name -> text and button widgets, other field types are never filled
+    for page in template_pdf.pages:
+        if ANNOT_KEY in page:
+            for annotation in page[ANNOT_KEY]:
+                if annotation[SUBTYPE_KEY] == WIDGET_SUBTYPE_KEY:
+                    if annotation[ANNOT_FIELD_KEY]:
+                        field_type = annotation[ANNOT_FIELD_TYPE_KEY]
+                        if field_type not in _widget_updates:
+                            continue
+                        on_state = None
+                        if field_type == ANNOT_FIELD_TYPE_BTN and annotation['/AP'] and annotation['/AP']['/N']:
+                            on_state = next(iter(annotation['/AP']['/N']))
+                        annotations.setdefault(annotation[ANNOT_FIELD_KEY][1:-1], []).append(
+                            Widget(annotation=annotation, field_type=field_type, on_state=on_state)
+                        )
+    logger.info("Template loaded %s", file)
+    return Template(pdf=template_pdf, annotations=annotations)
+
+
+_template_lock = threading.Lock()  # threads asking for a template at once get the same one
+
+
+def load_template(file):
+    with _template_lock:
+        return _load_template(file, os.stat(file).st_mtime_ns)
+
+
+def _copy_pdf_dict(obj):
+    # shallow copy, the values are shared
+    new = pdfrw.PdfDict()
+    dict.update(new, obj)
+    new.indirect = obj.indirect
+    return new
+
+
+def _filled_annotations(template, d):
+    # id of template annotation -> (template annotation, filled copy), the template is left as it is
+    filled = {}
+    for key, value in d.items():
+        for widget in template.annotations.get(key, ()):
+            if id(widget.annotation) not in filled:
+                filled[id(widget.annotation)] = widget.annotation, _copy_pdf_dict(widget.annotation)
+            filled[id(widget.annotation)][1].update(_widget_updates[widget.field_type](widget, value))
+    return filled
+
+
+def fill_pdf_from_keys(file, out_file, d):
+    # file is the pdf file
+    # d is the dictionary mapping the annotation fields to values
+    # only the widgets named in d are touched
+    # the cached template is shared and never changed: the writer swaps the filled copies in for the template
+    # annotations wherever they are referenced (pages, acroform fields), the trailer it updates is a copy too
+    template = load_template(file)
+    writer = pdfrw.PdfWriter()
+    writer.killobj.update(_filled_annotations(template, d))
+    try:
+        writer.write(out_file, _copy_pdf_dict(template.pdf))
         logger.info("Exporting PDF file %s succeeded", out_file)
     except OSError as e:
         logger.error("File must be open %s -- %s", out_file, e)
+
+
+def fill_pages_from_keys(file, d):
+    # same as fill_pdf_from_keys, but returns the filled pages instead of writing a file
+    # pages and touched annotations are copies, everything else is shared with the cached template
+    template = load_template(file)
+    filled = _filled_annotations(template, d)
+    pages = []
+    for page in template.pdf.pages:
+        page = _copy_pdf_dict(page)
+        if ANNOT_KEY in page:
+            page.Annots = pdfrw.PdfArray([filled[id(a)][1] if id(a) in filled else a for a in page[ANNOT_KEY]])
+        pages.append(page)
+    return pages